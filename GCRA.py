@@ -1,3 +1,4 @@
+from functools import partial
 from src.discrete import Environment
 
 class LeakyBucket(object):
@@ -32,7 +33,7 @@ if __name__ == "__main__":
 
   # Add all droplets
   for i in range(1,29):
-    BucketSim.add_event(lambda: B.add_drop(1), i-.1, "Droplet")
+    BucketSim.add_event(partial(B.add_drop, 1), i-.1, "Droplet")
 
   # Add all scheduled cart arrivals
   for i in [1, 6, 12, 19, 28]:
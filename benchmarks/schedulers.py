@@ -0,0 +1,57 @@
+"""
+Compares the Environment scheduler backends on the two access patterns our models produce
+  hold:    a steady population of N pending events, each pop schedules one new event
+           (vehicle ticks, link events)
+  preload: N events pushed up front and then drained (Queue.generate_arrival_events)
+Run from the repository root with: python -m benchmarks.schedulers
+"""
+from random import Random
+from time import perf_counter
+
+from tabulate import tabulate
+
+from src.schedulers import CalendarQueue, HeapScheduler
+
+BACKENDS = [("heap", HeapScheduler), ("calendar", CalendarQueue)]
+SIZES = [10**3, 10**4, 10**5, 10**6]
+
+def hold(scheduler, n, ops, rng):
+  seq = 0
+  for _ in range(n):
+    scheduler.push([rng.expovariate(1), seq, None])
+    seq += 1
+  start = perf_counter()
+  for _ in range(ops):
+    time = scheduler.pop()[0]
+    scheduler.push([time + rng.expovariate(1), seq, None])
+    seq += 1
+  return ops / (perf_counter() - start)
+
+def preload(scheduler, n, rng):
+  start = perf_counter()
+  t = 0
+  for seq in range(n):
+    t += rng.expovariate(130)
+    scheduler.push([t, seq, None])
+  while len(scheduler):
+    scheduler.pop()
+  return n / (perf_counter() - start)
+
+def main(sizes = SIZES, ops = 200000):
+  rows = []
+  for n in sizes:
+    for pattern in ["hold", "preload"]:
+      row = [pattern, n]
+      for _, backend in BACKENDS:
+        rng = Random(122)
+        if pattern == "hold":
+          row.append(hold(backend(), n, ops, rng))
+        else:
+          row.append(preload(backend(), n, rng))
+      rows.append(row)
+  headers = ["Pattern", "Pending events"] + ["{} (ops/s)".format(name) for name, _ in BACKENDS]
+  print(tabulate(rows, headers=headers, tablefmt="fancy_grid", floatfmt=".0f"))
+  return rows
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,189 @@
+"""
+Scaling benchmarks on synthetic workloads (see benchmarks/workloads.py)
+  build:          StreetGraph construction, nodes/s
+  shortest_path:  random point to point queries with the route cache off, Dijkstra and A*
+  drive:          Car.drive + Car.position per car step
+  link_lifetimes: RoutingGraph.set_link_lifetimes over a car population
+  environment:    Environment.run events/s holding SIZE pending events
+  queue:          MM1/MD1/DD1 packets/s, event driven and with the Lindley engine
+Results are written as JSON and compared against a stored baseline; anything slower than
+the baseline by more than the tolerance is reported and makes the run exit with status 1.
+Run from the repository root with: python -m benchmarks.suite [--sizes 1000 10000 ...]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from random import Random
+from time import perf_counter
+
+import numpy as np
+from tabulate import tabulate
+
+from dd1 import DD1Queue
+from md1 import MD1Queue
+from mm1 import MM1Queue
+from src.components import RoutingGraph
+from src.discrete import Environment
+from . import workloads
+
+SIZES = [10**3, 10**4, 10**5]
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Seconds spent timing each benchmark, rates are measured over as many operations as fit
+BUDGET = 1.0
+CARS = 1000
+# Cars leave from this many intersections, routing them is one shortest path tree each
+DEPOTS = 16
+
+def rate(op, items, budget = BUDGET):
+  # Operations per second of OP over ITEMS, stopping early once BUDGET seconds are spent
+  done = 0
+  start = perf_counter()
+  for item in items:
+    op(item)
+    done += 1
+    if perf_counter() - start > budget:
+      break
+  elapsed = perf_counter() - start
+  return done / elapsed if elapsed else 0.
+
+def result(benchmark, workload, size, value, unit):
+  return {"benchmark": benchmark, "workload": workload, "size": size, "value": value, "unit": unit}
+
+def bench_city(city, n, budget, only):
+  out = []
+  start = perf_counter()
+  sg = workloads.CITIES[city](n)
+  out.append(result("build", city, n, sg.node_count() / (perf_counter() - start), "nodes/s"))
+  labels = workloads.largest_component(sg)
+
+  if wanted("shortest_path", only):
+    sg.set_route_cache_size(0)
+    pairs = workloads.od_pairs(sg, 10000, labels = labels)
+    for name, astar in [("dijkstra", False), ("astar", True)]:
+      value = rate(lambda pair: sg.shortest_path(*pair, astar = astar), pairs, budget)
+      out.append(result("shortest_path." + name, city, n, value, "queries/s"))
+    sg.set_route_cache_size(32)
+
+  if wanted("drive", only) or wanted("link_lifetimes", only):
+    cars = sg.add_cars(workloads.car_population(sg, min(CARS, n // 2), labels = labels, depots = DEPOTS), processes = 1)
+    # Car.drive announces every intersection it passes
+    with contextlib.redirect_stdout(io.StringIO()):
+      if wanted("link_lifetimes", only):
+        rg = RoutingGraph(sg)
+        value = rate(lambda _: rg.set_link_lifetimes(), range(10**6), budget)
+        out.append(result("link_lifetimes", city, n, value * len(cars), "cars/s"))
+      if wanted("drive", only):
+        def steps():
+          # Only cars still on their way, until every one has arrived
+          while True:
+            active = [car for car in cars if car.getNextNode() is not None]
+            if not active:
+              return
+            yield from active
+        def step(car):
+          car.drive()
+          car.position()
+        value = rate(step, steps(), budget)
+        out.append(result("drive", city, n, value, "car steps/s"))
+  return out
+
+def bench_environment(n, budget):
+  # Hold model: N pending events, each one schedules the next
+  env = Environment()
+  rng = Random(122)
+  def tick():
+    env.add_event(tick, rng.expovariate(1))
+  for _ in range(n):
+    env.add_event(tick, rng.expovariate(1))
+  value = rate(lambda _: env.do_next_event(), range(10**8), budget)
+  return [result("environment", "hold", n, value, "events/s")]
+
+def bench_queues(n, budget):
+  out = []
+  for name, model in [("mm1", MM1Queue), ("md1", MD1Queue), ("dd1", DD1Queue)]:
+    lamb, mu = workloads.mm1_load(.65)
+    env = Environment()
+    q = model(lamb, mu, env)
+    q.generate_arrival_events(n)
+    # Two events per packet
+    value = rate(lambda _: env.do_next_event(), range(2 * n), budget)
+    out.append(result("queue." + name, "des", n, value / 2, "packets/s"))
+    start = perf_counter()
+    model(lamb, mu, Environment()).run_fast(n, seed = 122)
+    out.append(result("queue." + name, "lindley", n, n / (perf_counter() - start), "packets/s"))
+  return out
+
+def wanted(benchmark, only):
+  return not only or any(benchmark.startswith(prefix) for prefix in only)
+
+def run(sizes = SIZES, cities = sorted(workloads.CITIES), only = None, budget = BUDGET):
+  results = []
+  for n in sizes:
+    if any(wanted(b, only) for b in ["build", "shortest_path", "drive", "link_lifetimes"]):
+      for city in cities:
+        results += bench_city(city, n, budget, only)
+    if wanted("environment", only):
+      results += bench_environment(n, budget)
+    if wanted("queue", only):
+      results += bench_queues(n, budget)
+  return {"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                   "numpy": np.__version__, "machine": platform.machine(), "platform": platform.platform()},
+          "results": results}
+
+def _key(entry):
+  return entry["benchmark"], entry["workload"], entry["size"]
+
+def compare(report, baseline, tolerance = .25):
+  # Rows of (benchmark, workload, size, value, baseline, ratio, status), higher values
+  # are better everywhere
+  known = {_key(entry): entry["value"] for entry in baseline["results"]}
+  rows = []
+  for entry in report["results"]:
+    base = known.get(_key(entry))
+    ratio = entry["value"] / base if base else None
+    if ratio is None:
+      status = "new"
+    elif ratio < 1 - tolerance:
+      status = "REGRESSION"
+    elif ratio > 1 + tolerance:
+      status = "faster"
+    else:
+      status = "ok"
+    rows.append(list(_key(entry)) + [entry["value"], base, ratio, status])
+  return rows
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = "Scaling benchmarks on synthetic workloads")
+  parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES)
+  parser.add_argument("--cities", nargs = "+", default = sorted(workloads.CITIES), choices = sorted(workloads.CITIES))
+  parser.add_argument("--only", nargs = "+", help = "benchmark name prefixes to run")
+  parser.add_argument("--budget", type = float, default = BUDGET, help = "seconds per benchmark")
+  parser.add_argument("--out", default = "benchmark_results.json")
+  parser.add_argument("--baseline", default = BASELINE)
+  parser.add_argument("--save-baseline", action = "store_true", help = "store this run as the baseline")
+  parser.add_argument("--tolerance", type = float, default = .25)
+  args = parser.parse_args(argv)
+
+  report = run(args.sizes, args.cities, args.only, args.budget)
+  with open(args.out, "w") as f:
+    json.dump(report, f, indent = 2)
+  if args.save_baseline:
+    with open(args.baseline, "w") as f:
+      json.dump(report, f, indent = 2)
+
+  baseline = {"results": []}
+  if os.path.exists(args.baseline):
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+  rows = compare(report, baseline, args.tolerance)
+  headers = ["Benchmark", "Workload", "Size", "Value", "Baseline", "Ratio", "Status"]
+  print(tabulate(rows, headers = headers, tablefmt = "fancy_grid", floatfmt = ".2f"))
+  return 1 if any(row[-1] == "REGRESSION" for row in rows) else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Reproducible synthetic workloads for the benchmarks: city street graphs of any size,
+car populations with random origin/destination pairs and M/M/1 queue loads.
+Every generator takes a seed, so the same arguments always build the same workload
+"""
+import math
+from random import Random
+
+import numpy as np
+
+from src.components import EuclideanNode, StreetGraph
+from src.spatial import GridIndex
+
+def grid_city(n, seed = 122, spacing = 1.0):
+  # Square Manhattan style grid of about N intersections, labelled by integer
+  side = max(2, int(round(math.sqrt(n))))
+  sg = StreetGraph(nodeCls = EuclideanNode)
+  for i in range(side):
+    for j in range(side):
+      sg.add_node(i * spacing, j * spacing, i * side + j)
+  for i in range(side):
+    for j in range(side):
+      if i + 1 < side:
+        sg.add_edge(i * side + j, (i + 1) * side + j)
+      if j + 1 < side:
+        sg.add_edge(i * side + j, i * side + j + 1)
+  return sg
+
+def random_geometric_city(n, seed = 122, degree = 8):
+  # N intersections dropped uniformly on a square of area N, joined to every other
+  # intersection within the radius giving DEGREE neighbors on average
+  rng = np.random.default_rng(seed)
+  points = rng.uniform(0, math.sqrt(n), size=(n, 2))
+  sg = StreetGraph(nodeCls = EuclideanNode)
+  for label, (x, y) in enumerate(points.tolist()):
+    sg.add_node(x, y, label)
+  radius = math.sqrt(degree / math.pi)
+  i, j, _ = GridIndex(points, radius).pairs_within()
+  for a, b in zip(i.tolist(), j.tolist()):
+    sg.add_edge(a, b)
+  return sg
+
+def radial_city(n, seed = 122, spokes = 16, ring_spacing = 1.0):
+  # Old town layout: a center, concentric ring roads and radial avenues, about N
+  # intersections in total
+  rings = max(1, (n - 1) // spokes)
+  sg = StreetGraph(nodeCls = EuclideanNode)
+  sg.add_node(0., 0., 0)
+  label = lambda ring, spoke: 1 + ring * spokes + spoke
+  for ring in range(rings):
+    r = (ring + 1) * ring_spacing
+    for spoke in range(spokes):
+      theta = 2 * math.pi * spoke / spokes
+      sg.add_node(r * math.cos(theta), r * math.sin(theta), label(ring, spoke))
+  for ring in range(rings):
+    for spoke in range(spokes):
+      sg.add_edge(label(ring, spoke), label(ring, (spoke + 1) % spokes))
+      sg.add_edge(label(ring - 1, spoke) if ring else 0, label(ring, spoke))
+  return sg
+
+CITIES = {"grid": grid_city, "geometric": random_geometric_city, "radial": radial_city}
+
+def largest_component(sg):
+  # Labels of the biggest connected set of intersections, so random trips always have a route
+  seen = set()
+  best = []
+  for start in sg._node_list:
+    if start in seen:
+      continue
+    seen.add(start)
+    component, frontier = [start], [start]
+    while frontier:
+      node = frontier.pop()
+      for neighbor in node._neighbors:
+        if neighbor not in seen:
+          seen.add(neighbor)
+          component.append(neighbor)
+          frontier.append(neighbor)
+    if len(component) > len(best):
+      best = component
+  return [node._label for node in best]
+
+def od_pairs(sg, count, seed = 122, labels = None, depots = None):
+  # COUNT random (origin, destination) pairs of distinct intersections. With DEPOTS every
+  # trip starts from one of that many random intersections, which bounds the routing cost
+  # of StreetGraph.add_cars (one shortest path tree per origin)
+  rng = Random(seed)
+  labels = labels if labels is not None else largest_component(sg)
+  origins = rng.sample(labels, depots) if depots else labels
+  pairs = []
+  while len(pairs) < count:
+    origin, destination = rng.choice(origins), rng.choice(labels)
+    if origin != destination:
+      pairs.append((origin, destination))
+  return pairs
+
+def car_population(sg, count, seed = 122, speed = (.5, 2.), labels = None, depots = None):
+  # (origin, destination, label, speed) tuples for StreetGraph.add_cars
+  rng = Random(seed)
+  return [(origin, destination, "car{}".format(i), rng.uniform(*speed))
+          for i, (origin, destination) in enumerate(od_pairs(sg, count, seed, labels, depots))]
+
+def mm1_load(rho, mu = 200.):
+  # (lamb, mu) of an M/M/1 queue at utilization RHO
+  return rho * mu, mu
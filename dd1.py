@@ -1,6 +1,9 @@
 from src.discrete import Environment
 from src.queue import Queue
+from src.replicate import replicate
+from functools import partial
 from random import expovariate, seed
+import numpy as np
 from tabulate import tabulate
 
 class DD1Queue(Queue):
@@ -18,9 +21,22 @@ class DD1Queue(Queue):
   def service_rate(self):
     return 1/self.mu
 
+  def sample_interarrivals(self, n, rng):
+    return np.full(n, 1/self.lamb)
+
+  def sample_services(self, n, rng):
+    return np.full(n, 1/self.mu)
+
   def expected_dist(self, i):
+    # At most one packet is ever in the system, for a fraction rho of the time
     rho = self.lamb/self.mu
-    return rho if i else 1 - rho
+    return [1 - rho, rho][i] if i < 2 else 0
+
+  def expected_values(self):
+    return {"wait": 0,
+            "service": 1/self.mu,
+            "sojourn": 1/self.mu,
+            "avg_in_system": self.lamb/self.mu}
 
 
 if __name__ == "__main__":
@@ -34,14 +50,8 @@ if __name__ == "__main__":
   Q.generate_arrival_events(N)
   QueueSim.run()
 
-  avg_wait = 0
-  avg_service = 0
-  for pkt in Q.all_pkts:
-    avg_wait += pkt[2] - pkt[1]
-    avg_service += pkt[0]
-
-  avg_wait = avg_wait/N
-  avg_service = avg_service/N
+  avg_wait = Q.wait_stats.mean
+  avg_service = Q.service_stats.mean
 
   rho = lamb/mu
   expected_wait = rho
@@ -56,3 +66,6 @@ if __name__ == "__main__":
          ["Overall time error:", (avg_service + avg_wait - expected_overall) / expected_overall]]
   print(tabulate(tbl, floatfmt=".3f", tablefmt="fancy_grid"))
   Q.print_distribution()
+
+  # Same model again as independent replications on every core (Lindley engine), with error bars
+  replicate(partial(DD1Queue, lamb, mu), N, 10, seed=122, fast=True).print_table()
@@ -1,8 +1,11 @@
 from src.discrete import Environment
 from src.queue import Queue
+from src.replicate import replicate
+from functools import partial
 from random import expovariate, seed
+import numpy as np
 from tabulate import tabulate
-from math import e
+from math import exp, factorial
 class MD1Queue(Queue):
   """MD1 Queue discrete time simulator"""
   def __init__(self, lamb, mu, env):
@@ -18,11 +21,36 @@ class MD1Queue(Queue):
   def service_rate(self):
     return 1/self.mu
 
+  def sample_interarrivals(self, n, rng):
+    return rng.exponential(1/self.lamb, n)
+
+  def sample_services(self, n, rng):
+    return np.full(n, 1/self.mu)
+
   def expected_dist(self, i):
+    # Number in system of an M/D/1 queue: p_0 = 1-rho, p_1 = (1-rho)(e^rho - 1) and for i >= 2
+    #   p_i = (1-rho) sum_{k=1..i} (-1)^(i-k) e^(k rho) [(k rho)^(i-k)/(i-k)! + (k rho)^(i-k-1)/(i-k-1)!]
+    # with the second term left out for k = i. The sum alternates, so it is only accurate
+    # for the first twenty or so states
+    rho = self.lamb/self.mu
     if i == 0:
-      return 1 - 1/self.lamb
-    l = 1/self.lamb
-    return (1 - l) * (e**(i*l) - 1)
+      return 1 - rho
+    if i == 1:
+      return (1 - rho) * (exp(rho) - 1)
+    total = 0
+    for k in range(1, i + 1):
+      term = (k*rho)**(i-k) / factorial(i-k)
+      if k < i:
+        term += (k*rho)**(i-k-1) / factorial(i-k-1)
+      total += (-1)**(i-k) * exp(k*rho) * term
+    return (1 - rho) * total
+
+  def expected_values(self):
+    rho = self.lamb/self.mu
+    return {"wait": rho/(2*self.mu*(1-rho)),
+            "service": 1/self.mu,
+            "sojourn": 1/self.mu + rho/(2*self.mu*(1-rho)),
+            "avg_in_system": rho + .5 * rho**2 / (1 - rho)}
 
 
 if __name__ == "__main__":
@@ -36,14 +64,8 @@ if __name__ == "__main__":
   Q.generate_arrival_events(N)
   QueueSim.run()
 
-  avg_wait = 0
-  avg_service = 0
-  for pkt in Q.all_pkts:
-    avg_wait += pkt[2] - pkt[1]
-    avg_service += pkt[0]
-
-  avg_wait = avg_wait/N
-  avg_service = avg_service/N
+  avg_wait = Q.wait_stats.mean
+  avg_service = Q.service_stats.mean
 
   rho = lamb/mu
   expected_wait = rho/(2*mu*(1-rho))
@@ -60,4 +82,5 @@ if __name__ == "__main__":
   Q.print_distribution()
   print("Num expected in sys = {}".format(expected_in_sys))
 
-
+  # Same model again as independent replications on every core (Lindley engine), with error bars
+  replicate(partial(MD1Queue, lamb, mu), N, 10, seed=122, fast=True).print_table()
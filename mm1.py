@@ -1,5 +1,7 @@
 from src.discrete import Environment
 from src.queue import Queue
+from src.replicate import replicate
+from functools import partial
 from random import expovariate, seed
 from tabulate import tabulate
 
@@ -18,10 +20,23 @@ class MM1Queue(Queue):
   def service_rate(self):
     return expovariate(self.mu)
 
+  def sample_interarrivals(self, n, rng):
+    return rng.exponential(1/self.lamb, n)
+
+  def sample_services(self, n, rng):
+    return rng.exponential(1/self.mu, n)
+
   def expected_dist(self, i):
     rho = self.lamb/self.mu
     return (1-rho)*(rho**i)
 
+  def expected_values(self):
+    return {"wait": 1/(self.mu - self.lamb) - 1/self.mu,
+            "service": 1/self.mu,
+            "sojourn": 1/(self.mu - self.lamb),
+            "avg_in_system": 1/(self.mu/self.lamb - 1)}
+
+
 if __name__ == "__main__":
   seed(122*122)
   lamb = 130
@@ -33,14 +48,8 @@ if __name__ == "__main__":
   Q.generate_arrival_events(N)
   QueueSim.run()
 
-  avg_wait = 0
-  avg_service = 0
-  for pkt in Q.all_pkts:
-    avg_wait += pkt[2] - pkt[1] 
-    avg_service += pkt[0]
-
-  avg_wait = avg_wait/N
-  avg_service = avg_service/N
+  avg_wait = Q.wait_stats.mean
+  avg_service = Q.service_stats.mean
   expected_wait = 1/(mu - lamb) - 1/mu
   expected_overall = 1/(mu - lamb)
 
@@ -56,4 +65,9 @@ if __name__ == "__main__":
   Q.print_distribution()
   print("Num expected in sys = {}".format(expected_in_sys))
 
+  # Same model again as independent replications on every core (Lindley engine), with error bars
+  replicate(partial(MM1Queue, lamb, mu), N, 10, seed=122, fast=True).print_table()
 
+  # Only as many packets as a 5% confidence interval on the steady state wait needs
+  estimate = MM1Queue(lamb, mu, Environment()).run_until_precision("wait", .05)
+  print("Steady state wait: {mean:.6f} +/- {halfwidth:.6f} after {n} packets ({warmup} warm-up)".format(**estimate))
@@ -0,0 +1,43 @@
+from multiprocessing import Pool, cpu_count
+
+# Read-only graph each worker process routes on, installed once by _init_worker
+_graph = None
+
+def _init_worker(graph):
+  global _graph
+  _graph = graph
+
+def _routes_from_source(job):
+  # One shortest path tree answers every destination sharing this source
+  source, destinations = job
+  _, pred = _graph.shortest_path_tree(source)
+  return source, [(dest, _graph.path_from_tree(pred, dest)) for dest in destinations]
+
+def route_batch(graph, queries, processes = None):
+  """
+  Routes every (source, destination) pair in QUERIES on the FrozenStreetGraph GRAPH
+  Returns a dict mapping each pair to its list of node labels. PROCESSES defaults to
+  the number of cores; with 1 (or a single source) everything runs in this process
+  """
+  jobs = {}
+  for source, destination in queries:
+    jobs.setdefault(source, set()).add(destination)
+  jobs = [(source, sorted(dests, key=graph._id_from_label)) for source, dests in jobs.items()]
+
+  processes = min(processes or cpu_count(), len(jobs))
+  if processes <= 1:
+    _init_worker(graph)
+    try:
+      results = list(map(_routes_from_source, jobs))
+    finally:
+      _init_worker(None)
+  else:
+    with Pool(processes, _init_worker, (graph,)) as pool:
+      results = list(pool.imap_unordered(_routes_from_source, jobs,
+                                         chunksize=max(1, len(jobs) // (4 * processes))))
+
+  routes = {}
+  for source, paths in results:
+    for dest, path in paths:
+      routes[source, dest] = path
+  return routes
@@ -0,0 +1,85 @@
+from array import array
+
+# Column order of a packet: (service time, queueing start time, queueing stop time)
+COLUMNS = ("service", "arrival", "start")
+
+class PacketBuffer(object):
+  """
+  FIFO of packets stored as three parallel array('d') columns used as a ring buffer
+  Appending and popping from the front are O(1), the capacity doubles when full, and
+  each packet costs 24 bytes instead of a tuple of three boxed floats
+  """
+  def __init__(self, capacity = 16):
+    if capacity < 1:
+      raise ValueError("capacity must be at least 1")
+    self._cols = [array('d', bytes(8 * capacity)) for _ in COLUMNS]
+    self._capacity = capacity
+    self._head = 0
+    self._size = 0
+
+  def __len__(self):
+    return self._size
+
+  def append(self, pkt):
+    if self._size == self._capacity:
+      self._grow()
+    i = (self._head + self._size) % self._capacity
+    for col, value in zip(self._cols, pkt):
+      col[i] = value
+    self._size += 1
+
+  def popleft(self):
+    if not self._size:
+      raise IndexError("pop from empty packet buffer")
+    i = self._head
+    service, arrival, start = self._cols
+    self._head = (i + 1) % self._capacity
+    self._size -= 1
+    return service[i], arrival[i], start[i]
+
+  def __getitem__(self, k):
+    if not -self._size <= k < self._size:
+      raise IndexError("packet buffer index out of range")
+    i = (self._head + k % self._size) % self._capacity
+    return tuple(col[i] for col in self._cols)
+
+  def __iter__(self):
+    for k in range(self._size):
+      yield self[k]
+
+  def _grow(self):
+    # Unwraps the ring into arrays twice the size
+    head, cap = self._head, self._capacity
+    self._cols = [col[head:] + col[:head] + array('d', bytes(8 * cap)) for col in self._cols]
+    self._head = 0
+    self._capacity = 2 * cap
+
+  def nbytes(self):
+    return sum(col.itemsize * len(col) for col in self._cols)
+
+
+class PacketTrace(object):
+  """Append-only record of served packets in the same columnar layout as PacketBuffer"""
+  def __init__(self):
+    self._cols = [array('d') for _ in COLUMNS]
+
+  def __len__(self):
+    return len(self._cols[0])
+
+  def append(self, pkt):
+    for col, value in zip(self._cols, pkt):
+      col.append(value)
+
+  def __getitem__(self, k):
+    return tuple(col[k] for col in self._cols)
+
+  def __iter__(self):
+    return zip(*self._cols)
+
+  def column(self, name):
+    return self._cols[COLUMNS.index(name)]
+
+  def as_numpy(self):
+    # Zero copy views of the columns
+    import numpy as np
+    return {name: np.frombuffer(col, dtype=np.float64) for name, col in zip(COLUMNS, self._cols)}
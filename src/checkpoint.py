@@ -0,0 +1,43 @@
+import pickle
+import random
+
+import numpy as np
+
+from .discrete import CheckpointError
+
+FORMAT = 1
+
+def checkpoint(env, *models, path = None):
+  """
+  Snapshot of a running simulation: the Environment (clock, event count and pending events),
+  the model objects in MODELS (Queues, StreetGraphs and their Cars, a LeakyBucket...) and
+  the state of the random and numpy.random generators. Pending events are stored as
+  (target object, method, args) descriptors, see discrete.describe_callback, so they have
+  to be bound methods, picklable callables or functools.partial of them rather than closures.
+  Returns the checkpoint as bytes, also written to PATH if given. Every restore builds an
+  independent copy, so one warmed up run can branch into many experiments
+  """
+  state = {"format": FORMAT, "env": env, "models": models,
+           "random": random.getstate(), "numpy": np.random.get_state()}
+  try:
+    data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+  except (pickle.PicklingError, TypeError, AttributeError) as e:
+    raise CheckpointError("Simulation state can't be checkpointed: {}".format(e)) from e
+  if path:
+    with open(path, "wb") as f:
+      f.write(data)
+  return data
+
+def restore(data = None, path = None, rng = True):
+  # Returns (env, models) rebuilt from DATA or the file at PATH. With RNG the global
+  # random and numpy.random generators are put back where they were at checkpoint time
+  if data is None:
+    with open(path, "rb") as f:
+      data = f.read()
+  state = pickle.loads(data)
+  if state.get("format") != FORMAT:
+    raise CheckpointError("Unknown checkpoint format {}".format(state.get("format")))
+  if rng:
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy"])
+  return state["env"], state["models"]
@@ -1,11 +1,15 @@
-import copy
 import math
+from collections import OrderedDict, namedtuple
+from heapq import heappop, heappush
 
-from util import quadratic
+import numpy as np
+
+from .spatial import GridIndex
+from .util import link_lifetimes, quadratic
 
 class Car(object):
   """web enabled car"""
-  def __init__(self, source, destination, label, sg, speed, rad = 1):
+  def __init__(self, source, destination, label, sg, speed, rad = 1, route = None):
     self._source = source
     self._destination = destination
     self._label = label
@@ -15,12 +19,13 @@ class Car(object):
     self._next_node_dist_traveled = 0
     self._linkLife = dict()
     self._rad = rad
-    self._calculate_route()
+    self._calculate_route(route)
 
   def getSpeed(self):
     return self._speed
 
   def getNextNode(self):
+    self._sync_fleet()
     return self._next_node
 
   def getRad(self):
@@ -28,21 +33,41 @@ class Car(object):
 
   def getLinkLife(self, target_car_label):
     if target_car_label in self._linkLife:
-      return self._linkLife[target_car]
+      return self._linkLife[target_car_label]
     else:
       return None
 
   def setLinkLife(self, target_car_label, linkVal):
-    self._linkLife[target_car] = linkVal
+    self._linkLife[target_car_label] = linkVal
 
   def resetLinks(self):
     self._linkLife.clear()
 
   def set_speed(self, speed):
     self._speed = speed
-
-  def _calculate_route(self):
-    route, _ = self._sg.shortest_path(self._source, self._destination)
+    # Keep a running fleet in step with this car
+    fleet = getattr(self._sg, "_fleet", None)
+    if fleet is not None:
+      fleet.set_speed(self._label, speed)
+    self._notify_motion()
+
+  def _sync_fleet(self):
+    # While the street graph drives its cars as a Fleet, that is where their state lives
+    fleet = getattr(self._sg, "_fleet", None)
+    if fleet is not None:
+      fleet.sync_car(self)
+    return fleet
+
+  def _notify_motion(self):
+    # Tells whoever is watching the street graph (e.g. KineticRoutingGraph) that this
+    # car's velocity just changed
+    for listener in getattr(self._sg, "_motion_listeners", ()):
+      listener(self)
+
+  def _calculate_route(self, route = None):
+    # ROUTE can be handed in precomputed (see StreetGraph.add_cars), it is consumed in place
+    if route is None:
+      route, _ = self._sg.shortest_path(self._source, self._destination, astar = True)
     self._last_node = route.pop(0)
     self._route = route
     self._update_next_dest()
@@ -57,21 +82,29 @@ class Car(object):
       self._next_node_dist_traveled = 0
 
   def drive(self):
-    if self._next_node:
+    fleet = self._sync_fleet()
+    if self._next_node is not None:
       self._next_node_dist_traveled += self._speed
+      turned = False
       while True:
-        if self._next_node and self._next_node_dist_traveled >= self._next_node_dist:
+        if self._next_node is not None and self._next_node_dist_traveled >= self._next_node_dist:
           self._next_node_dist_traveled -= self._next_node_dist
           print("Passing {}".format(self._next_node))
           self._last_node = self._next_node
           self._update_next_dest()
+          turned = True
         else:
           break
+      if fleet is not None:
+        fleet.update_from_car(self)
+      if turned:
+        self._notify_motion()
     else:
       raise Exception("We are done driving")
 
   def position(self):
     # Calculates the position as a weighted average of the prev and next nodes
+    self._sync_fleet()
     if(self._next_node_dist == 0):
       # We are already there!
       return self._sg.get_xy_coords(self._destination)
@@ -92,6 +125,8 @@ class Node(object):
     self._y = y
     self._label = label
     self._neighbors = {}
+    # Dense integer id assigned by the owning StreetGraph
+    self._id = None
     
   def __repr__(self):
     return self._label
@@ -104,6 +139,11 @@ class Node(object):
   def neighbors(self):
     return self._neighbors.items()
 
+  def heuristic(self, other):
+    # Lower bound on the road distance to OTHER, used by A*. Plain nodes have
+    # arbitrary edge weights so nothing better than 0 is admissible
+    return 0
+
 
 class EuclideanNode(Node):
   """Node in a graph representing a single street intersection. Calculates Euclidian distance between other's x and y"""
@@ -115,6 +155,10 @@ class EuclideanNode(Node):
     assert other not in self._neighbors
     self._neighbors[other] = math.sqrt((self._x - other._x)**2 + (self._y - other._y)**2)
 
+  def heuristic(self, other):
+    # Straight line distance never overestimates a path of Euclidean edges
+    return math.sqrt((self._x - other._x)**2 + (self._y - other._y)**2)
+
 
 class ManhattanNode(Node):
   """Node in a graph representing a single street intersection. Calculates Manhattan distance between other's x and y"""
@@ -126,29 +170,108 @@ class ManhattanNode(Node):
     assert other not in self._neighbors
     self._neighbors[other] = abs(self._x - other._x) + abs(self._y - other._y)
 
+  def heuristic(self, other):
+    return abs(self._x - other._x) + abs(self._y - other._y)
+
+
+RouteCacheInfo = namedtuple("RouteCacheInfo", ["hits", "misses", "maxsize", "currsize"])
 
 class StreetGraph(object):
   """Graph class containing information and methods related to roadways"""
-  def __init__(self, nodeCls = Node, carCls = Car):
+  def __init__(self, nodeCls = Node, carCls = Car, route_cache_size = 32):
     self._nodes = set()
     self._cars = set()
     self._nodeCls = nodeCls
     self._carCls = carCls
+    # Label -> object indices so lookups on the driving hot path are O(1)
+    self._node_index = {}
+    self._car_index = {}
+    # Dense integer ids: node._id is the node's position in this list
+    self._node_list = []
+    # LRU of source node -> (dist, prev) shortest path trees
+    self._route_cache = OrderedDict()
+    self._route_cache_size = route_cache_size
+    # Sources that missed the cache recently, a second miss from one of them builds its tree
+    self._route_sources = OrderedDict()
+    self.route_cache_hits = 0
+    self.route_cache_misses = 0
+    # Optional contraction hierarchy answering shortest_path queries
+    self._hierarchy = None
+    # Vectorized driving state, owns the cars' progress while running (see drive_all)
+    self._fleet = None
+    # Callbacks run with a car whenever its velocity changes
+    self._motion_listeners = []
 
   def add_car(self, origin, destination, label, speed = 1):
+    if label in self._car_index:
+      raise Exception("A car with label {} already exists".format(label))
+    self.stop_fleet()
     delorian = self._carCls(origin, destination, label, self, speed)
     self._cars.add(delorian)
+    self._car_index[label] = delorian
     return delorian
 
+  def add_cars(self, cars, processes = None):
+    # Adds many cars at once. CARS is a list of (origin, destination, label, speed) tuples.
+    # Routes are computed one shortest path tree per distinct origin, spread over a
+    # process pool working on a frozen copy of the graph (see src/batch.py)
+    from .batch import route_batch
+    labels = set(self._car_index)
+    for car in cars:
+      if car[2] in labels:
+        raise Exception("A car with label {} already exists".format(car[2]))
+      labels.add(car[2])
+    self.stop_fleet()
+    routes = route_batch(self.freeze(), [(c[0], c[1]) for c in cars], processes)
+    added = []
+    for origin, destination, label, speed in cars:
+      delorian = self._carCls(origin, destination, label, self, speed,
+                              route = list(routes[origin, destination]))
+      self._cars.add(delorian)
+      self._car_index[label] = delorian
+      added.append(delorian)
+    return added
+
+  def start_fleet(self):
+    # Moves every car's driving state into a vectorized Fleet (see src/fleet.py).
+    # Until stop_fleet is called the Car methods read and write their state through it
+    from .fleet import Fleet
+    self._fleet = Fleet(self._car_index.values())
+    return self._fleet
+
+  def stop_fleet(self):
+    # Writes the fleet state back into the Car objects
+    if self._fleet is not None:
+      self._fleet.sync_cars()
+      self._fleet = None
+
+  def drive_all(self):
+    # Drives every car one step and returns an (N, 2) array of positions, one row per
+    # car in the order they were added
+    fleet = self._fleet if self._fleet is not None else self.start_fleet()
+    turned = fleet.drive()
+    # Same notifications as Car.drive, for the cars that passed a node
+    if self._motion_listeners:
+      for i in np.flatnonzero(turned).tolist():
+        fleet.cars[i]._notify_motion()
+    return fleet.positions()
+
   def add_node(self, x, y, label):
+    if label in self._node_index:
+      raise Exception("A node with label {} already exists".format(label))
     node = self._nodeCls(x, y, label)
+    node._id = len(self._node_list)
+    self._node_list.append(node)
+    self._node_index[label] = node
     self._nodes.add(node)
+    self._invalidate_routes()
 
   def add_edge(self, label1, label2, dist = 1):
     node1 = self._node_from_label(label1)
     node2 = self._node_from_label(label2)
     node1.add_neighbor(node2, dist)
     node2.add_neighbor(node1, dist)
+    self._invalidate_routes()
 
   def get_edge(self, label1, label2):
     node1 = self._node_from_label(label1)
@@ -160,25 +283,67 @@ class StreetGraph(object):
     return node._x, node._y 
 
   def _node_from_label(self, label):
-    for n in self._nodes:
-      if n._label == label:
-        return n
-    raise Exception("No node could be found corresponding to label: {}".format(label))
+    try:
+      return self._node_index[label]
+    except KeyError:
+      raise Exception("No node could be found corresponding to label: {}".format(label))
 
   def _car_from_label(self, label):
-    for c in self._cars:
-      if c._label == label:
-        return c
-    raise Exception("No car could be found corresponding to label: {}".format(label))
+    try:
+      return self._car_index[label]
+    except KeyError:
+      raise Exception("No car could be found corresponding to label: {}".format(label))
+
+  def _node_from_id(self, node_id):
+    return self._node_list[node_id]
+
+  def node_count(self):
+    return len(self._node_list)
+
+  def __getstate__(self):
+    # Nodes reach each other through their neighbor maps, which pickle recursively and
+    # overflow the stack on big graphs, so the topology is stored as flat lists.
+    # Cached shortest path trees are dropped
+    state = self.__dict__.copy()
+    for key in ["_nodes", "_node_index", "_route_cache", "_route_sources"]:
+      del state[key]
+    state["_node_list"] = [(n._x, n._y, n._label) for n in self._node_list]
+    state["_edges"] = [(n._id, m._id, d) for n in self._node_list for m, d in n._neighbors.items()]
+    return state
+
+  def __setstate__(self, state):
+    nodes = state.pop("_node_list")
+    edges = state.pop("_edges")
+    self.__dict__.update(state)
+    self._nodes = set()
+    self._node_index = {}
+    self._node_list = []
+    self._route_cache = OrderedDict()
+    self._route_sources = OrderedDict()
+    for x, y, label in nodes:
+      node = self._nodeCls(x, y, label)
+      node._id = len(self._node_list)
+      self._node_list.append(node)
+      self._node_index[label] = node
+      self._nodes.add(node)
+    for i, j, d in edges:
+      self._node_list[i]._neighbors[self._node_list[j]] = d
+
+  def freeze(self):
+    # Immutable CSR view of the current topology for bulk routing, see src/frozen.py
+    from .frozen import FrozenStreetGraph
+    return FrozenStreetGraph.from_street_graph(self)
 
   def get_car_velocity(self, car):
     ''' Returns a tuple of (vel_x, vel_y) corresponding to the car matching LABEL in the street graph'''
+    if car.getNextNode() is None:
+      return 0, 0
     x, y = car.position()
     sp = car.getSpeed()
     dest_x, dest_y = self.get_xy_coords(car.getNextNode())
-    vx1 = dest_x - x
-    vy1 = dest_y - y
-    vnorm1 = math.sqrt(vx^2 + vy^2)
+    vx = dest_x - x
+    vy = dest_y - y
+    vnorm1 = math.sqrt(vx**2 + vy**2)
     try:
       vel_x = vx / vnorm1 * sp
       vel_y = vy / vnorm1 * sp
@@ -186,40 +351,133 @@ class StreetGraph(object):
     except ZeroDivisionError:
       return 0, 0
 
-  def shortest_path(self, label1, label2):
+  def shortest_path(self, label1, label2, astar = False):
     # Returns a list of labels corresponding to the shortest path from label1 to label2 and the total distance
+    # A source with a cached shortest path tree is answered by walking back up the tree.
+    # Otherwise a point to point search is run - A* if ASTAR is set - unless label1 already
+    # missed the cache recently, in which case its full tree is built and cached
+    if self._hierarchy is not None:
+      return self._hierarchy.shortest_path(label1, label2)
+
     s = self._node_from_label(label1)
     t = self._node_from_label(label2)
-    if not s or not t:
-      return
-
-    dist = {}
-    prev = {}
 
-    for n in self._nodes:
-      dist[n] = math.inf
-      prev[n] = None
-
-    dist[s] = 0
+    if self._route_cache_size and (s in self._route_cache or self._repeated_source(s)):
+      dist, prev = self._shortest_path_tree(s)
+    else:
+      if self._route_cache_size:
+        self.route_cache_misses += 1
+      dist, prev = self._search(s, t, astar)
 
-    Q = copy.copy(self._nodes)
-    while Q:
-      # O(n^2) time because I'm a piece of human garbage
-      _, smallest = min([ (dist[n], n) for n in Q ], key = lambda x: x[0])
-      Q.remove(smallest)
+    path = []
+    bt = t
+    while bt:
+      path.append(bt._label)
+      bt = prev.get(bt)
+    path.reverse()
+
+    return path, dist.get(t, math.inf)
+
+  def shortest_path_tree(self, label):
+    # Returns (dist, prev) dicts, keyed by node label, for every node reachable from LABEL
+    dist, prev = self._shortest_path_tree(self._node_from_label(label))
+    return ({n._label: d for n, d in dist.items()},
+            {n._label: p and p._label for n, p in prev.items()})
+
+  def _shortest_path_tree(self, s):
+    tree = self._route_cache.get(s)
+    if tree is not None:
+      self.route_cache_hits += 1
+      self._route_cache.move_to_end(s)
+      return tree
+    self.route_cache_misses += 1
+    tree = self._search(s)
+    if self._route_cache_size:
+      self._route_cache[s] = tree
+      if len(self._route_cache) > self._route_cache_size:
+        self._route_cache.popitem(last = False)
+    return tree
+
+  def _repeated_source(self, s):
+    # True if S missed the cache recently, otherwise remembers it. A few times more
+    # sources than trees are remembered, they are only node references
+    if s in self._route_sources:
+      del self._route_sources[s]
+      return True
+    self._route_sources[s] = None
+    if len(self._route_sources) > 4 * self._route_cache_size:
+      self._route_sources.popitem(last = False)
+    return False
+
+  def _search(self, s, t = None, astar = False):
+    # Heap based Dijkstra from S, or explores everything reachable if T is None. With ASTAR
+    # the node class' heuristic steers the search to T.
+    # Among equally short routes a node's predecessor is always the one with the smallest
+    # id, so early exit, A* and full trees (the route cache) all return the same path.
+    # That takes settling every node that could still be on a shortest path to T, i.e.
+    # stopping once the smallest priority left is past T's distance
+    astar = astar and t is not None
+    dist = {s: 0}
+    prev = {s: None}
+    done = set()
+    # Entries are (priority, node id, node) so ties never compare Node objects
+    heap = [(s.heuristic(t) if astar else 0, s._id, s)]
+    while heap:
+      priority, _, smallest = heappop(heap)
+      if smallest in done:
+        continue
+      if t is not None:
+        limit = dist.get(t, math.inf)
+        # A little slack for rounding in the heuristic
+        if priority > limit + 1e-9 * limit:
+          break
+      done.add(smallest)
       for neighbor, ndist in smallest.neighbors():
         newdist = dist[smallest] + ndist
-        if newdist < dist[neighbor]:
+        old = dist.get(neighbor, math.inf)
+        if newdist < old:
           dist[neighbor] = newdist
           prev[neighbor] = smallest
-
-    path = []
-    bt = t
-    while bt:
-      path.insert(0, bt._label)
-      bt = prev[bt]
-
-    return path, dist[t]
+          priority = newdist + neighbor.heuristic(t) if astar else newdist
+          heappush(heap, (priority, neighbor._id, neighbor))
+        elif newdist == old and ndist > 0 and smallest._id < prev[neighbor]._id:
+          prev[neighbor] = smallest
+    return dist, prev
+
+  def set_route_cache_size(self, size):
+    self._route_cache_size = size
+    while len(self._route_cache) > size:
+      self._route_cache.popitem(last = False)
+    while len(self._route_sources) > 4 * size:
+      self._route_sources.popitem(last = False)
+
+  def route_cache_info(self):
+    return RouteCacheInfo(self.route_cache_hits, self.route_cache_misses,
+                          self._route_cache_size, len(self._route_cache))
+
+  def build_hierarchy(self):
+    # Preprocesses the current topology into a contraction hierarchy, see src/hierarchy.py.
+    # Until the topology changes, shortest_path is answered from it
+    from .hierarchy import ContractionHierarchy
+    self._hierarchy = ContractionHierarchy.build(self.freeze())
+    return self._hierarchy
+
+  def load_hierarchy(self, path):
+    # Loads a hierarchy written with ContractionHierarchy.save for this same graph
+    from .hierarchy import ContractionHierarchy
+    hierarchy = ContractionHierarchy.load(path)
+    # Same labels aren't enough, a changed road or weight would give wrong routes
+    if (hierarchy.labels != [n._label for n in self._node_list]
+        or hierarchy.fingerprint != self.freeze().fingerprint()):
+      raise Exception("Hierarchy at {} was built for a different graph".format(path))
+    self._hierarchy = hierarchy
+    return hierarchy
+
+  def _invalidate_routes(self):
+    # Any change in topology can change any shortest path tree
+    self._route_cache.clear()
+    self._route_sources.clear()
+    self._hierarchy = None
 
 #########################################################################################
 
@@ -236,58 +494,67 @@ class AccessPoint(object):
     return self._x, self._y
 
 
-class RoutingGraph(Object):
+class RoutingGraph(object):
   """Routing Graph keeps track of the LinkLife/Edges"""
   def __init__(self, sGraph):
+    self._sg = sGraph
     self._cars = sGraph._cars 
     self._edges = dict()
 
   def update_edges(self):
-    for c in self._nodes:
-      for k, v in c._linkLife:
-        self._edges[c] = (k, v)
+    for c in self._cars:
+      for k, v in c._linkLife.items():
+        self._edges[c._label, k] = v
+
+  def candidate_pairs(self):
+    # Returns (cars, i, j) where cars[i] and cars[j] are within both of their radio radii.
+    # A grid index sized to the largest radius keeps this proportional to local density
+    cars = list(self._cars)
+    if len(cars) < 2:
+      return cars, [], []
+    positions = np.array([c.position() for c in cars])
+    radii = np.array([c.getRad() for c in cars], dtype=np.float64)
+    if radii.max() <= 0:
+      # No car can reach any other, and the grid needs a positive cell size
+      return cars, [], []
+    i, j, dist = GridIndex(positions, radii.max()).pairs_within()
+    keep = dist <= np.minimum(radii[i], radii[j])
+    return cars, i[keep].tolist(), j[keep].tolist()
 
   def set_link_lifetimes(self):
-    # Sets Link Life of car (edges)
-    for c in sGraph._cars:
-      c.resetLink()
-      x, y = c.position()
-      for ci in sGraph._cars:
-        if (c == ci):
-          continue
-        xi, yi = ci.position()
-        dX = x - xi
-        dY = y - yi
-        dist = math.sqrt(dX**2 + dY**2)
-        if dist > c.getRad() or dist > ci.getRad():
-          continue
-        else:
-          linkVal = detLinkLife(c, ci, sGraph)
-          c.setLinkLife(ci, linkVal)
+    # Sets Link Life of car (edges). All in range pairs are solved at once, both ways round
+    # since each direction uses its own car's radius
+    cars, pairs_i, pairs_j = self.candidate_pairs()
+    for c in cars:
+      c.resetLinks()
+    if not pairs_i:
+      return
+    positions = np.array([c.position() for c in cars])
+    velocities = np.array([self._sg.get_car_velocity(c) for c in cars], dtype=np.float64)
+    radii = np.array([c.getRad() for c in cars], dtype=np.float64)
+    first = np.concatenate((pairs_i, pairs_j))
+    second = np.concatenate((pairs_j, pairs_i))
+    lives = link_lifetimes(positions[first] - positions[second],
+                           velocities[first] - velocities[second], radii[first])
+    for a, b, life in zip(first.tolist(), second.tolist(), lives.tolist()):
+      cars[a].setLinkLife(cars[b]._label, life)
 
   @classmethod
   def determine_link_life(cls, car1, car2, sGraph):
     a_x, a_y = car1.position()
     b_x, b_y = car2.position()
-    av_x, av_y = sGraph.get_car_velocity(car1.label)
-    bv_x, bv_y = sGraph.get_car_velocity(car2.label)
+    av_x, av_y = sGraph.get_car_velocity(car1)
+    bv_x, bv_y = sGraph.get_car_velocity(car2)
     a = a_x - b_x
     b = a_y - b_y
     c = av_x - bv_x
-    d = av_x - bv_y
+    d = av_y - bv_y
     
-    c_0 = a^2 + b^2 - car1.getRad()^2
+    c_0 = a**2 + b**2 - car1.getRad()**2
     c_1 = 2*a*c + 2*b*d
-    c_2 = c^2 + d^2
+    c_2 = c**2 + d**2
     
     try:
       return max(quadratic(c_2, c_1, c_0))
     except ZeroDivisionError:
-      return inf
-
-
-
-
-
-
-
+      return math.inf
@@ -1,26 +1,167 @@
-from heapq import heappop, heappush
+import inspect
+from functools import partial
+
+from .instrument import Instrumentation
+from .schedulers import HeapScheduler
 
 class NoEventError(Exception):
   pass
 
+class CheckpointError(Exception):
+  pass
+
+def describe_callback(func):
+  # Serializable (target, method name, args, kwargs) descriptor of an event callback. Works
+  # for bound methods, module level functions and other picklable callables (target None,
+  # name is the callable itself) and functools.partial of those; closures and lambdas can't
+  # be restored
+  if isinstance(func, partial):
+    target, name, args, kwargs = describe_callback(func.func)
+    return target, name, args + func.args, dict(kwargs, **func.keywords)
+  if inspect.ismethod(func):
+    return func.__self__, func.__name__, (), {}
+  if "<" in getattr(func, "__qualname__", ""):
+    raise CheckpointError("Callback {!r} is a closure or lambda and can't be checkpointed, schedule "
+                          "a bound method or a functools.partial of one instead".format(func))
+  return None, func, (), {}
+
+def resolve_callback(target, name, args, kwargs):
+  # Inverse of describe_callback
+  func = getattr(target, name) if target is not None else name
+  return partial(func, *args, **kwargs) if args or kwargs else func
+
+
+class Event(object):
+  """
+  Handle to a scheduled event, returned by Environment.add_event
+  Cancelling only marks the heap entry as dead (it is skipped when popped), so it is O(1)
+  """
+  __slots__ = ["func", "message", "_env", "_entry"]
+
+  def __init__(self, env, func, message):
+    self._env = env
+    self.func = func
+    self.message = message
+    self._entry = None
+
+  @property
+  def time(self):
+    return self._entry[0] if self._entry else None
+
+  @property
+  def pending(self):
+    return self._entry is not None
+
+  def cancel(self):
+    if self._entry is not None:
+      self._entry[2] = None
+      self._entry = None
+      self._env._cancelled += 1
+
+  def reschedule(self, time):
+    # Moves the event to TIME from now, even if it was cancelled
+    self.cancel()
+    self._env._push(self, self._env.time_elapsed + time)
+
+  def __getstate__(self):
+    # The callback is stored as a descriptor, see src/checkpoint.py
+    return {"callback": describe_callback(self.func), "message": self.message,
+            "env": self._env, "entry": self._entry}
+
+  def __setstate__(self, state):
+    self.func = resolve_callback(*state["callback"])
+    self.message = state["message"]
+    self._env = state["env"]
+    self._entry = state["entry"]
+
+
+class Source(object):
+  """
+  Recurring event driven by an iterator of absolute times
+  Only the next occurrence is ever pending: when it fires, FUNC is called and the following
+  time is pulled from TIMES, so a source costs one queue entry no matter how long it runs
+  """
+  def __init__(self, env, times, func, message="some"):
+    self.env = env
+    self.func = func
+    self.message = message
+    self.count = 0
+    self.done = False
+    self._times = iter(times)
+    self._event = None
+
+  def start(self):
+    self._schedule_next()
+    return self
+
+  def stop(self):
+    self.done = True
+    if self._event is not None:
+      self._event.cancel()
+      self._event = None
+
+  def _schedule_next(self):
+    try:
+      time = next(self._times)
+    except StopIteration:
+      self.done = True
+      self._event = None
+      return
+    self._event = self.env.add_fixed_event(self._fire, time, self.message)
+
+  def _fire(self):
+    self.count += 1
+    # Pull the next time first so FUNC sees whether this was the last occurrence
+    self._schedule_next()
+    self.func()
+
+
 class Environment(object):
   """Parent environment used to run Discrete Event Simulations"""
-  def __init__(self, verbosity = False):
+  # Rebuild the queue once cancelled entries make up more than this fraction of it
+  COMPACT_RATIO = .5
+  COMPACT_MIN_SIZE = 1024
+
+  def __init__(self, verbosity = False, scheduler = None):
     self.time_elapsed = 0
-    self.event_queue = []
+    # Pending [time, sequence number, Event] entries, a binary heap unless another backend
+    # from src/schedulers.py is passed in. The sequence number breaks ties in insertion
+    # order so Events are never compared, and the Event is None'd out on cancellation
+    self.event_queue = scheduler if scheduler is not None else HeapScheduler()
     self.v = verbosity
     self.regular_events = []
     self.event_count = 0
-    
+    self._seq = 0
+    self._cancelled = 0
+    # Profiler installed by instrument(), None keeps do_next_event on its plain path
+    self.instrumentation = None
+
+  def instrument(self, sample_every = 1):
+    # Starts profiling the events run from now on, see src/instrument.py
+    self.instrumentation = Instrumentation(sample_every)
+    return self.instrumentation
+
+  def uninstrument(self):
+    instrumentation, self.instrumentation = self.instrumentation, None
+    return instrumentation
+
   def add_event(self, eventfunc, time, message="some"):
     # Events are just functions. When the function is executed, the event is done
     # Time is relative- an event with time=5 added at time_elapsed=2 will occur at time_elapsed=7
-    execution_time = self.time_elapsed + time
-    heappush(self.event_queue, (execution_time, eventfunc, message))
-    
+    # Returns an Event handle that can be cancelled or rescheduled
+    event = Event(self, eventfunc, message)
+    self._push(event, self.time_elapsed + time)
+    return event
+
+  def _push(self, event, execution_time):
+    entry = [execution_time, self._seq, event]
+    self._seq += 1
+    event._entry = entry
+    self.event_queue.push(entry)
+
   def add_fixed_event(self, eventfunc, time, message="some"):
     # Adds an event at an absolute time - not relative
-    self.add_event(eventfunc, time-self.time_elapsed, message)
+    return self.add_event(eventfunc, time-self.time_elapsed, message)
 
   def add_regular_event(self, eventfunc, interval):
     # Adds an event that occurs every INTERVAL number of events- for logging purposes
@@ -31,21 +172,39 @@ class Environment(object):
       if self.event_count % interval == 0:
         eventfunc()
 
+  def pending_events(self):
+    return len(self.event_queue) - self._cancelled
+
+  def _compact(self):
+    # Drops cancelled entries in one pass instead of popping them one by one
+    if len(self.event_queue) > self.COMPACT_MIN_SIZE and self._cancelled > self.COMPACT_RATIO * len(self.event_queue):
+      self.event_queue.compact()
+      self._cancelled = 0
+
   def do_next_event(self):
     # Pop the soonest event off the heap and run it
     # Decrease the time of all the other events
-    try:
-      time, eventfunc, message = heappop(self.event_queue)
-      assert time > 0
-      self.time_elapsed = time
-      self.v and print("Executing {} event at time {}".format(message, self.time_elapsed))
-      eventfunc()
-      self.event_count += 1
-      self.do_regular_events()
-    except IndexError:
-      self.v and print("No events left in queue")
-      raise NoEventError()
-      
+    self._compact()
+    while True:
+      try:
+        time, _, event = self.event_queue.pop()
+      except IndexError:
+        self.v and print("No events left in queue")
+        raise NoEventError()
+      if event is not None:
+        break
+      self._cancelled -= 1
+    event._entry = None
+    assert time > 0
+    self.time_elapsed = time
+    self.v and print("Executing {} event at time {}".format(event.message, self.time_elapsed))
+    if self.instrumentation is None:
+      event.func()
+    else:
+      self.instrumentation.run(event, self)
+    self.event_count += 1
+    self.do_regular_events()
+
   def run(self):
     # Run events until there are no more in the queue
     while True:
@@ -54,6 +213,15 @@ class Environment(object):
       except NoEventError:
         break
 
+  def run_until(self, condition):
+    # Runs events until CONDITION() holds. Returns False if the events ran out first
+    while not condition():
+      try:
+        self.do_next_event()
+      except NoEventError:
+        return False
+    return True
+
   def run_till_time(self, time):
     # Run till total time elapsed is greater than TIME
     while self.time_elapsed < time:
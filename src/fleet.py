@@ -0,0 +1,124 @@
+import numpy as np
+
+class Fleet(object):
+  """
+  Vectorized driving state for a set of cars on one street graph
+  Every car's remaining route is flattened into shared arrays of node coordinates, edge
+  lengths and edge directions. Per car only the index of the last node passed, the
+  progress along the current edge and the speed are kept, so a tick for the whole fleet
+  is a handful of array operations. Semantics follow Car.drive and Car.position, except
+  that cars which are done driving are skipped instead of raising.
+  While a fleet runs, the Car objects read their state from it and write it back through
+  sync_car and update_from_car, so both views of a car stay in step
+  """
+  def __init__(self, cars):
+    self.cars = list(cars)
+    self.labels = [c._label for c in self.cars]
+    self._rows = {label: i for i, label in enumerate(self.labels)}
+    n = len(self.cars)
+    self.speed = np.array([c._speed for c in self.cars], dtype=np.float64)
+    self.progress = np.array([c._next_node_dist_traveled for c in self.cars], dtype=np.float64)
+    # cursor is the flat index of the last node passed, last the flat index of the destination
+    self.cursor = np.empty(n, dtype=np.int64)
+    self.last = np.empty(n, dtype=np.int64)
+
+    route_labels = []
+    for i, car in enumerate(self.cars):
+      self.cursor[i] = len(route_labels)
+      route_labels.append(car._last_node)
+      if car._next_node is not None:
+        route_labels.append(car._next_node)
+        route_labels.extend(car._route)
+      self.last[i] = len(route_labels) - 1
+    self._route_labels = route_labels
+    # Cursor each car's route fields were last written for, see sync_car
+    self._synced = self.cursor.copy()
+
+    # Per flat route node: its coordinates, and the length and unit direction of the edge
+    # leaving it (0 for each car's destination)
+    m = len(route_labels)
+    self.node_x = np.empty(m)
+    self.node_y = np.empty(m)
+    self.edge_len = np.zeros(m)
+    is_last = np.zeros(m, dtype=bool)
+    is_last[self.last] = True
+    sg = self.cars[0]._sg if self.cars else None
+    for k, label in enumerate(route_labels):
+      self.node_x[k], self.node_y[k] = sg.get_xy_coords(label)
+      if not is_last[k]:
+        self.edge_len[k] = sg.get_edge(label, route_labels[k + 1])
+    dx = np.where(is_last, 0, np.roll(self.node_x, -1) - self.node_x)
+    dy = np.where(is_last, 0, np.roll(self.node_y, -1) - self.node_y)
+    theta = np.arctan2(dy, dx)
+    self.edge_dx = np.where(is_last, 0, np.cos(theta))
+    self.edge_dy = np.where(is_last, 0, np.sin(theta))
+
+  def __len__(self):
+    return len(self.cars)
+
+  def active(self):
+    # Mask of cars that still have somewhere to go
+    return self.cursor < self.last
+
+  def set_speed(self, label, speed):
+    self.speed[self._rows[label]] = speed
+
+  def drive(self):
+    # Advances every active car by its speed, passing as many nodes as needed. Returns the
+    # mask of cars that passed a node, i.e. whose velocity changed
+    moving = self.active()
+    turned = np.zeros(len(self.cars), dtype=bool)
+    self.progress[moving] += self.speed[moving]
+    while True:
+      passing = moving & (self.progress >= self.edge_len[self.cursor])
+      if not passing.any():
+        break
+      turned |= passing
+      self.progress[passing] -= self.edge_len[self.cursor[passing]]
+      self.cursor[passing] += 1
+      moving = self.active()
+    self.progress[~moving] = 0
+    return turned
+
+  def positions(self):
+    # Returns an (N, 2) array of car positions, in the order of self.labels
+    c = self.cursor
+    out = np.empty((len(self.cars), 2))
+    out[:, 0] = self.node_x[c] + self.progress * self.edge_dx[c]
+    out[:, 1] = self.node_y[c] + self.progress * self.edge_dy[c]
+    return out
+
+  def sync_cars(self):
+    # Writes the fleet state back into the Car objects it was built from
+    for i, car in enumerate(self.cars):
+      self._sync(i, car)
+
+  def sync_car(self, car):
+    # Writes the fleet state of CAR back into it
+    self._sync(self._rows[car._label], car)
+
+  def _sync(self, i, car):
+    # The route is only copied again when the car has passed a node since the last sync
+    k, last = int(self.cursor[i]), int(self.last[i])
+    car._speed = float(self.speed[i])
+    if self._synced[i] != k:
+      self._synced[i] = k
+      car._last_node = self._route_labels[k]
+      if k < last:
+        car._next_node = self._route_labels[k + 1]
+        car._route = self._route_labels[k + 2:last + 1]
+        car._next_node_dist = float(self.edge_len[k])
+      else:
+        car._next_node = None
+        car._route = []
+        car._next_node_dist = 0
+    car._next_node_dist_traveled = float(self.progress[i]) if k < last else 0
+
+  def update_from_car(self, car):
+    # Reads back the state of CAR after it was driven on its own. Its remaining route is
+    # always a suffix of the one the fleet was built with
+    i = self._rows[car._label]
+    remaining = len(car._route) + (car._next_node is not None)
+    self.cursor[i] = self._synced[i] = self.last[i] - remaining
+    self.progress[i] = car._next_node_dist_traveled
+    self.speed[i] = car._speed
@@ -0,0 +1,189 @@
+import hashlib
+import math
+from heapq import heappop, heappush
+
+import numpy as np
+
+from .components import EuclideanNode, ManhattanNode
+
+class FrozenStreetGraph(object):
+  """
+  Immutable compressed sparse row view of a StreetGraph
+  Node i's neighbors are targets[offsets[i]:offsets[i+1]] with matching weights,
+  and its coordinates are x[i], y[i]. Cars can still be added and driven on it
+  """
+  def __init__(self, labels, x, y, offsets, targets, weights, heuristic = None, carCls = None):
+    self.labels = list(labels)
+    self.x = np.ascontiguousarray(x, dtype=np.float64)
+    self.y = np.ascontiguousarray(y, dtype=np.float64)
+    self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+    self.targets = np.ascontiguousarray(targets, dtype=np.int64)
+    self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+    for arr in [self.x, self.y, self.offsets, self.targets, self.weights]:
+      arr.flags.writeable = False
+    # 'euclidean', 'manhattan' or None - picks the A* heuristic
+    self.heuristic = heuristic
+    self._index = {label: i for i, label in enumerate(self.labels)}
+    # Memoryviews index straight to Python scalars, much cheaper than numpy scalars in loops
+    self._offsets_mv = memoryview(self.offsets)
+    self._targets_mv = memoryview(self.targets)
+    self._weights_mv = memoryview(self.weights)
+    self._x_mv = memoryview(self.x)
+    self._y_mv = memoryview(self.y)
+    self._cars = set()
+    self._car_index = {}
+    self._carCls = carCls
+    self._motion_listeners = []
+
+  def __reduce__(self):
+    # Memoryviews can't be pickled, so rebuild from the arrays. Cars are not carried over
+    return (self.__class__, (self.labels, self.x, self.y, self.offsets, self.targets,
+                             self.weights, self.heuristic, self._carCls))
+
+  @classmethod
+  def from_street_graph(cls, sg):
+    nodes = sg._node_list
+    n = len(nodes)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    for node in nodes:
+      offsets[node._id + 1] = len(node._neighbors)
+    np.cumsum(offsets, out=offsets)
+    targets = np.empty(offsets[-1], dtype=np.int64)
+    weights = np.empty(offsets[-1], dtype=np.float64)
+    for node in nodes:
+      # Rows are sorted by target id so get_edge can binary search
+      row = sorted((other._id, dist) for other, dist in node.neighbors())
+      start = offsets[node._id]
+      for j, (other_id, dist) in enumerate(row):
+        targets[start + j] = other_id
+        weights[start + j] = dist
+
+    heuristic = None
+    if issubclass(sg._nodeCls, EuclideanNode):
+      heuristic = 'euclidean'
+    elif issubclass(sg._nodeCls, ManhattanNode):
+      heuristic = 'manhattan'
+    return cls([node._label for node in nodes],
+               [node._x for node in nodes],
+               [node._y for node in nodes],
+               offsets, targets, weights, heuristic, sg._carCls)
+
+  def fingerprint(self):
+    # Hash of the topology (CSR offsets, targets and weights), telling apart graphs that
+    # share their labels but not their roads
+    digest = hashlib.sha1()
+    for array in [self.offsets, self.targets, self.weights]:
+      digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+  def nbytes(self):
+    return sum(a.nbytes for a in [self.x, self.y, self.offsets, self.targets, self.weights])
+
+  def node_count(self):
+    return len(self.labels)
+
+  def _id_from_label(self, label):
+    try:
+      return self._index[label]
+    except KeyError:
+      raise Exception("No node could be found corresponding to label: {}".format(label))
+
+  def _car_from_label(self, label):
+    try:
+      return self._car_index[label]
+    except KeyError:
+      raise Exception("No car could be found corresponding to label: {}".format(label))
+
+  def add_car(self, origin, destination, label, speed = 1):
+    delorian = self._carCls(origin, destination, label, self, speed)
+    self._cars.add(delorian)
+    self._car_index[label] = delorian
+    return delorian
+
+  def get_edge(self, label1, label2):
+    i = self._id_from_label(label1)
+    j = self._id_from_label(label2)
+    start, stop = self.offsets[i], self.offsets[i + 1]
+    k = start + np.searchsorted(self.targets[start:stop], j)
+    if k == stop or self.targets[k] != j:
+      raise KeyError(label2)
+    return float(self.weights[k])
+
+  def get_xy_coords(self, label):
+    i = self._id_from_label(label)
+    return self._x_mv[i], self._y_mv[i]
+
+  def _heuristic_fn(self, t):
+    xs, ys = self._x_mv, self._y_mv
+    tx, ty = xs[t], ys[t]
+    if self.heuristic == 'euclidean':
+      return lambda i: math.sqrt((xs[i] - tx)**2 + (ys[i] - ty)**2)
+    if self.heuristic == 'manhattan':
+      return lambda i: abs(xs[i] - tx) + abs(ys[i] - ty)
+    return None
+
+  def _search(self, s, t = -1, astar = False):
+    # Heap based Dijkstra over the CSR arrays, with the same stopping rule and tie breaking
+    # (smallest predecessor id) as StreetGraph._search, so both give the same routes
+    h = self._heuristic_fn(t) if astar and t >= 0 else None
+    offsets, targets, weights = self._offsets_mv, self._targets_mv, self._weights_mv
+    dist = {s: 0}
+    prev = {s: -1}
+    done = set()
+    heap = [(h(s) if h else 0, s)]
+    while heap:
+      priority, u = heappop(heap)
+      if u in done:
+        continue
+      if t >= 0:
+        limit = dist.get(t, math.inf)
+        if priority > limit + 1e-9 * limit:
+          break
+      done.add(u)
+      du = dist[u]
+      for k in range(offsets[u], offsets[u + 1]):
+        v = targets[k]
+        w = weights[k]
+        newdist = du + w
+        old = dist.get(v, math.inf)
+        if newdist < old:
+          dist[v] = newdist
+          prev[v] = u
+          heappush(heap, (newdist + h(v) if h else newdist, v))
+        elif newdist == old and w > 0 and u < prev[v]:
+          prev[v] = u
+    return dist, prev
+
+  def shortest_path(self, label1, label2, astar = False):
+    # Same contract as StreetGraph.shortest_path
+    s = self._id_from_label(label1)
+    t = self._id_from_label(label2)
+    dist, prev = self._search(s, t, astar)
+    path = []
+    bt = t
+    while bt >= 0:
+      path.append(self.labels[bt])
+      bt = prev.get(bt, -1)
+    path.reverse()
+    return path, dist.get(t, math.inf)
+
+  def shortest_path_tree(self, label):
+    # Returns (dist, pred) arrays over node ids. Unreachable nodes have dist inf and pred -1
+    dist, prev = self._search(self._id_from_label(label))
+    n = self.node_count()
+    dist_arr = np.full(n, np.inf)
+    pred_arr = np.full(n, -1, dtype=np.int64)
+    ids = np.fromiter(dist.keys(), dtype=np.int64, count=len(dist))
+    dist_arr[ids] = np.fromiter(dist.values(), dtype=np.float64, count=len(dist))
+    pred_arr[ids] = np.fromiter((prev[i] for i in dist), dtype=np.int64, count=len(dist))
+    return dist_arr, pred_arr
+
+  def path_from_tree(self, pred, label):
+    # Walks PRED (as returned by shortest_path_tree) back from LABEL
+    path = []
+    bt = self._id_from_label(label)
+    while bt >= 0:
+      path.append(self.labels[bt])
+      bt = pred[bt]
+    path.reverse()
+    return path
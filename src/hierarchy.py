@@ -0,0 +1,248 @@
+import math
+from heapq import heapify, heappop, heappush
+
+import numpy as np
+
+class ContractionHierarchy(object):
+  """
+  Contraction hierarchy over an (undirected) street graph
+  Nodes are contracted one at a time in order of importance, adding shortcut edges so
+  distances between the remaining nodes are preserved. A query is then a bidirectional
+  Dijkstra that only ever walks upwards in rank, which touches a tiny part of the graph.
+  Upward edges are kept in CSR form: node i's are up_targets[up_offsets[i]:up_offsets[i+1]],
+  and up_middle holds the contracted node a shortcut skips over (-1 for real roads).
+  FINGERPRINT is the FrozenStreetGraph.fingerprint of the graph it was built from
+  """
+  # Witness searches give up after settling this many nodes. Giving up early only
+  # adds unnecessary shortcuts, never wrong answers
+  WITNESS_SETTLE_LIMIT = 32
+
+  def __init__(self, labels, rank, up_offsets, up_targets, up_weights, up_middle, fingerprint = None):
+    self.labels = list(labels)
+    self.fingerprint = fingerprint
+    self.rank = np.asarray(rank, dtype=np.int64)
+    self.up_offsets = np.asarray(up_offsets, dtype=np.int64)
+    self.up_targets = np.asarray(up_targets, dtype=np.int64)
+    self.up_weights = np.asarray(up_weights, dtype=np.float64)
+    self.up_middle = np.asarray(up_middle, dtype=np.int64)
+    self._index = {label: i for i, label in enumerate(self.labels)}
+    self._offsets_mv = memoryview(self.up_offsets)
+    self._targets_mv = memoryview(self.up_targets)
+    self._weights_mv = memoryview(self.up_weights)
+    self._middle_mv = memoryview(self.up_middle)
+    self._rank_mv = memoryview(self.rank)
+
+  def __reduce__(self):
+    # Memoryviews can't be pickled, so rebuild from the arrays
+    return (self.__class__, (self.labels, self.rank, self.up_offsets, self.up_targets,
+                             self.up_weights, self.up_middle, self.fingerprint))
+
+  @classmethod
+  def build(cls, graph):
+    # GRAPH is a FrozenStreetGraph
+    n = graph.node_count()
+    offsets, targets, weights = graph.offsets.tolist(), graph.targets.tolist(), graph.weights.tolist()
+    # Remaining graph: adj[u][v] = (weight, middle node)
+    adj = [dict() for _ in range(n)]
+    for u in range(n):
+      for k in range(offsets[u], offsets[u + 1]):
+        v, w = targets[k], weights[k]
+        if u != v and (v not in adj[u] or w < adj[u][v][0]):
+          adj[u][v] = (w, -1)
+          adj[v][u] = (w, -1)
+
+    contracted = [False] * n
+    deleted_neighbors = [0] * n
+    level = [0] * n
+    rank = [0] * n
+    upward = [None] * n
+
+    def priority(v):
+      shortcuts = cls._shortcuts(adj, v)
+      return len(shortcuts) - len(adj[v]) + deleted_neighbors[v] + level[v], shortcuts
+
+    heap = [(priority(v)[0], v) for v in range(n)]
+    heapify(heap)
+    order = 0
+    while heap:
+      _, v = heappop(heap)
+      if contracted[v]:
+        continue
+      # Lazy update: only contract V if it is still the least important node
+      prio, shortcuts = priority(v)
+      if heap and prio > heap[0][0]:
+        heappush(heap, (prio, v))
+        continue
+
+      for u, x, w in shortcuts:
+        if x not in adj[u] or w < adj[u][x][0]:
+          adj[u][x] = (w, v)
+          adj[x][u] = (w, v)
+      upward[v] = sorted((u, w, m) for u, (w, m) in adj[v].items())
+      for u in adj[v]:
+        del adj[u][v]
+        deleted_neighbors[u] += 1
+        level[u] = max(level[u], level[v] + 1)
+      adj[v] = {}
+      contracted[v] = True
+      rank[v] = order
+      order += 1
+
+    up_offsets = [0] * (n + 1)
+    for v in range(n):
+      up_offsets[v + 1] = up_offsets[v] + len(upward[v])
+    flat = [edge for v in range(n) for edge in upward[v]]
+    return cls(graph.labels, rank, up_offsets,
+               [e[0] for e in flat], [e[1] for e in flat], [e[2] for e in flat], graph.fingerprint())
+
+  @classmethod
+  def _shortcuts(cls, adj, v):
+    # Returns the (u, x, weight) shortcuts needed to contract V: one for every pair of
+    # neighbors whose only shortest connection runs through V
+    neighbors = list(adj[v].items())
+    shortcuts = []
+    for i, (u, (wu, _)) in enumerate(neighbors):
+      rest = neighbors[i + 1:]
+      if not rest:
+        continue
+      limit = wu + max(wx for _, (wx, _) in rest)
+      witness = cls._witness_search(adj, u, v, limit, set(x for x, _ in rest))
+      for x, (wx, _) in rest:
+        if witness.get(x, math.inf) > wu + wx:
+          shortcuts.append((u, x, wu + wx))
+    return shortcuts
+
+  @classmethod
+  def _witness_search(cls, adj, s, skip, limit, targets):
+    # Dijkstra from S avoiding SKIP, stopping once every node in TARGETS is settled
+    dist = {s: 0}
+    heap = [(0, s)]
+    settled = 0
+    remaining = len(targets)
+    while heap and settled < cls.WITNESS_SETTLE_LIMIT:
+      d, u = heappop(heap)
+      if d > dist[u]:
+        continue
+      if d > limit:
+        break
+      settled += 1
+      if u in targets:
+        remaining -= 1
+        if not remaining:
+          break
+      for x, (w, _) in adj[u].items():
+        if x == skip:
+          continue
+        nd = d + w
+        if nd < dist.get(x, math.inf):
+          dist[x] = nd
+          heappush(heap, (nd, x))
+    return dist
+
+  def _id_from_label(self, label):
+    try:
+      return self._index[label]
+    except KeyError:
+      raise Exception("No node could be found corresponding to label: {}".format(label))
+
+  def shortest_path(self, label1, label2):
+    # Same contract as StreetGraph.shortest_path
+    s = self._id_from_label(label1)
+    t = self._id_from_label(label2)
+    offsets, targets, weights = self._offsets_mv, self._targets_mv, self._weights_mv
+
+    dists = ({s: 0}, {t: 0})
+    prevs = ({s: -1}, {t: -1})
+    heaps = ([(0, s)], [(0, t)])
+    best, meet = math.inf, -1
+    while heaps[0] or heaps[1]:
+      # Step the side with the smaller key. Stop once neither side can beat BEST
+      top0 = heaps[0][0][0] if heaps[0] else math.inf
+      top1 = heaps[1][0][0] if heaps[1] else math.inf
+      if min(top0, top1) >= best:
+        break
+      side = 0 if top0 <= top1 else 1
+      dist, prev, heap, other = dists[side], prevs[side], heaps[side], dists[1 - side]
+      d, u = heappop(heap)
+      if d > dist[u]:
+        continue
+      if u in other and d + other[u] < best:
+        best, meet = d + other[u], u
+      # Stall on demand: if a higher ranked neighbor already reaches U more cheaply, U
+      # cannot be on a shortest up-path and there is no point in relaxing its edges
+      stall = False
+      for k in range(offsets[u], offsets[u + 1]):
+        if dist.get(targets[k], math.inf) + weights[k] < d:
+          stall = True
+          break
+      if stall:
+        continue
+      for k in range(offsets[u], offsets[u + 1]):
+        v = targets[k]
+        nd = d + weights[k]
+        if nd < dist.get(v, math.inf):
+          dist[v] = nd
+          prev[v] = u
+          heappush(heap, (nd, v))
+
+    if meet < 0:
+      return [label2], math.inf
+
+    up = []
+    bt = meet
+    while bt >= 0:
+      up.append(bt)
+      bt = prevs[0][bt]
+    up.reverse()
+    bt = prevs[1][meet]
+    while bt >= 0:
+      up.append(bt)
+      bt = prevs[1][bt]
+
+    path = [up[0]]
+    for a, b in zip(up, up[1:]):
+      path.extend(self._unpack(a, b))
+    return [self.labels[i] for i in path], best
+
+  def _upward_edge(self, a, b):
+    # Returns (weight, middle) of the edge between A and B, stored on the lower ranked end
+    if self._rank_mv[a] > self._rank_mv[b]:
+      a, b = b, a
+    best = None
+    for k in range(self._offsets_mv[a], self._offsets_mv[a + 1]):
+      if self._targets_mv[k] == b and (best is None or self._weights_mv[k] < best[0]):
+        best = self._weights_mv[k], self._middle_mv[k]
+    return best
+
+  def _unpack(self, a, b):
+    # Expands the (possibly shortcut) edge A -> B into the nodes after A on the real road path
+    out = []
+    stack = [(a, b)]
+    while stack:
+      a, b = stack.pop()
+      _, middle = self._upward_edge(a, b)
+      if middle < 0:
+        out.append(b)
+      else:
+        stack.append((middle, b))
+        stack.append((a, middle))
+    return out
+
+  def save(self, path):
+    # Filled one by one so tuple labels are not unpacked into extra dimensions
+    labels = np.empty(len(self.labels), dtype=object)
+    for i, label in enumerate(self.labels):
+      labels[i] = label
+    # Written through a file object, so numpy doesn't append ".npz" to PATH and load finds
+    # the file under the name it was given
+    with open(path, "wb") as f:
+      np.savez_compressed(f, labels=labels, fingerprint=np.array(self.fingerprint or ""),
+                          rank=self.rank, up_offsets=self.up_offsets, up_targets=self.up_targets,
+                          up_weights=self.up_weights, up_middle=self.up_middle)
+
+  @classmethod
+  def load(cls, path):
+    with np.load(path, allow_pickle=True) as data:
+      fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+      return cls(data["labels"].tolist(), data["rank"], data["up_offsets"],
+                 data["up_targets"], data["up_weights"], data["up_middle"], fingerprint or None)
@@ -0,0 +1,97 @@
+import json
+from time import perf_counter
+
+from tabulate import tabulate
+
+from .stats import DelayStats
+
+class Instrumentation(object):
+  """
+  Opt-in profile of an Environment run, installed with Environment.instrument()
+  Counts every event by its message and times the callbacks with perf_counter. With
+  SAMPLE_EVERY = k only every k-th event of each message is timed (the first one included),
+  so periodic event streams can't hide a handler; counts stay exact and total times are
+  scaled up from the timed ones. Also tracks the current and peak number of live pending
+  events, measured once each event is done
+  """
+  def __init__(self, sample_every = 1):
+    self.sample_every = sample_every
+    self.events = 0
+    self.counts = {}
+    # Callback wall times per message, in seconds
+    self.times = {}
+    self.queue_size = 0
+    self.peak_queue_size = 0
+    self.started = None
+    self.last = None
+
+  def run(self, event, env):
+    # Runs EVENT's callback on behalf of Environment.do_next_event
+    now = perf_counter()
+    if self.started is None:
+      self.started = now
+    self.events += 1
+    message = event.message
+    count = self.counts[message] = self.counts.get(message, 0) + 1
+
+    if (count - 1) % self.sample_every:
+      event.func()
+      self.last = perf_counter()
+    else:
+      start = perf_counter()
+      event.func()
+      self.last = perf_counter()
+      stats = self.times.get(message)
+      if stats is None:
+        stats = self.times[message] = DelayStats()
+      stats.add(self.last - start)
+
+    # Cancelled entries still sitting in the queue don't count
+    size = env.pending_events()
+    self.queue_size = size
+    if size > self.peak_queue_size:
+      self.peak_queue_size = size
+
+  @property
+  def wall_time(self):
+    return self.last - self.started if self.started is not None else 0.
+
+  def report(self):
+    handlers = {}
+    for message, count in self.counts.items():
+      entry = {"count": count, "timed": 0, "total_time": 0.}
+      stats = self.times.get(message)
+      if stats is not None:
+        summary = stats.summary()
+        # Estimated from the timed events when sampling
+        entry.update(timed=summary["n"], total_time=summary["mean"] * count, mean=summary["mean"],
+                     p50=summary["p50"], p90=summary["p90"], p99=summary["p99"], max=summary["max"])
+      handlers[str(message)] = entry
+    wall = self.wall_time
+    return {"events": self.events,
+            "sample_every": self.sample_every,
+            "wall_time": wall,
+            "events_per_sec": self.events / wall if wall else 0.,
+            "queue_size": self.queue_size,
+            "peak_queue_size": self.peak_queue_size,
+            "handlers": dict(sorted(handlers.items(), key=lambda item: -item[1]["total_time"]))}
+
+  def to_json(self, path = None):
+    # Returns the report as JSON, also written to PATH if given
+    out = json.dumps(self.report(), indent=2)
+    if path:
+      with open(path, "w") as f:
+        f.write(out)
+    return out
+
+  def print_report(self):
+    report = self.report()
+    print("{} events in {:.3f}s ({:.0f} events/s), event queue at {} (peak {})".format(
+      report["events"], report["wall_time"], report["events_per_sec"],
+      report["queue_size"], report["peak_queue_size"]))
+    headers = ["Event", "Count", "Total (s)", "Mean (us)", "p50 (us)", "p99 (us)", "Max (us)"]
+    tbl = []
+    for message, entry in report["handlers"].items():
+      us = [1e6 * entry.get(key, 0.) for key in ["mean", "p50", "p99", "max"]]
+      tbl.append([message, entry["count"], entry["total_time"]] + us)
+    print(tabulate(tbl, headers=headers, tablefmt="fancy_grid", floatfmt=".3f"))
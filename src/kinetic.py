@@ -0,0 +1,146 @@
+import math
+from functools import partial
+
+import numpy as np
+
+from .components import RoutingGraph
+from .util import link_intervals
+
+class KineticRoutingGraph(RoutingGraph):
+  """
+  Routing graph that keeps links up to date through events instead of recomputing them
+  Between velocity changes every car moves in a straight line, so the exact time each
+  link forms and breaks is known in advance and scheduled on ENV. Only when a car changes
+  speed or turns at a node are the pairs involving that car re-solved. Cars are assumed
+  to drive once per unit of simulated time, and a link exists while two cars are within
+  both of their radii.
+  With a HORIZON, link formations are only scheduled that far ahead and everything is
+  re-solved every HORIZON time units, for as long as some car is still driving and other
+  events are pending (otherwise nothing can move a car any more).
+  Cars may be driven one by one or as a fleet through StreetGraph.drive_all
+  """
+  def __init__(self, sGraph, env, horizon = None):
+    super(KineticRoutingGraph, self).__init__(sGraph)
+    self._env = env
+    self._horizon = horizon
+    # (row a, row b) with a < b -> absolute time the link breaks
+    self._links = {}
+    # (row a, row b) -> handle of the pair's next form or break event
+    self._pending = {}
+    self.link_events = 0
+    self._rows = {}
+    self._rescan = None
+    sGraph._motion_listeners.append(self._car_moved)
+
+  def start(self):
+    # Snapshots every car's motion and schedules all link events from now on
+    self._car_list = list(self._cars)
+    n = len(self._car_list)
+    self._rows = {c: i for i, c in enumerate(self._car_list)}
+    self._p0 = np.zeros((n, 2))
+    self._v = np.zeros((n, 2))
+    self._t0 = np.zeros(n)
+    self._rad = np.array([c.getRad() for c in self._car_list], dtype=np.float64)
+    for event in self._pending.values():
+      event.cancel()
+    self._pending.clear()
+    if self._rescan is not None:
+      self._rescan.cancel()
+    self._links.clear()
+    for c in self._car_list:
+      c.resetLinks()
+      self._snapshot(self._rows[c])
+    self._reschedule_all()
+
+  def links(self):
+    # Returns {(label a, label b): remaining lifetime} for every current link
+    now = self._env.time_elapsed
+    return {(self._car_list[a]._label, self._car_list[b]._label): t - now
+            for (a, b), t in self._links.items()}
+
+  def set_link_lifetimes(self):
+    # Links are maintained by events, there is nothing to recompute
+    pass
+
+  def _snapshot(self, i):
+    car = self._car_list[i]
+    self._p0[i] = car.position()
+    self._v[i] = self._sg.get_car_velocity(car)
+    self._t0[i] = self._env.time_elapsed
+
+  def _reschedule_all(self):
+    n = len(self._car_list)
+    for i in range(n - 1):
+      self._schedule_pairs(i, np.arange(i + 1, n))
+    if self._horizon:
+      self._rescan = self._env.add_event(self._horizon_rescan, self._horizon, "Link rescan")
+
+  def _horizon_rescan(self):
+    # Rescanning only goes on while some car still has somewhere to go and something besides
+    # link events is scheduled to drive it, otherwise it would keep Environment.run going
+    self._rescan = None
+    others = self._env.pending_events() - len(self._pending)
+    if others > 0 and any(c.getNextNode() is not None for c in self._car_list):
+      self._reschedule_all()
+
+  def _car_moved(self, car):
+    i = self._rows.get(car)
+    if i is None:
+      return
+    self._snapshot(i)
+    others = np.arange(len(self._car_list))
+    self._schedule_pairs(i, others[others != i])
+
+  def _schedule_pairs(self, i, others):
+    # Re-solves the pairs between car I and each car in OTHERS from the current time
+    if not len(others):
+      return
+    now = self._env.time_elapsed
+    pos_i = self._p0[i] + self._v[i] * (now - self._t0[i])
+    pos_o = self._p0[others] + self._v[others] * (now - self._t0[others])[:, None]
+    enter, leave = link_intervals(pos_i - pos_o, self._v[i] - self._v[others],
+                                  np.minimum(self._rad[i], self._rad[others]))
+    horizon = self._horizon or math.inf
+    for o, t_in, t_out in zip(others.tolist(), enter.tolist(), leave.tolist()):
+      key = (i, o) if i < o else (o, i)
+      # Whatever was coming up for this pair was based on the old motion
+      event = self._pending.pop(key, None)
+      if event is not None:
+        event.cancel()
+      if t_in <= 0 < t_out:
+        self._form(key, now + t_out)
+      else:
+        if key in self._links:
+          self._break(key)
+        if 0 < t_in <= horizon:
+          self._schedule_form(key, t_in, t_out - t_in)
+
+  def _schedule_form(self, key, delay, duration):
+    break_time = self._env.time_elapsed + delay + duration
+    self._schedule(key, delay, partial(self._form, key, break_time), "Link form")
+
+  def _schedule(self, key, delay, action, message):
+    # Bound methods and partials only, so pending link events can be checkpointed
+    self._pending[key] = self._env.add_event(partial(self._fire, key, action), delay, message)
+
+  def _fire(self, key, action):
+    del self._pending[key]
+    self.link_events += 1
+    action()
+
+  def _form(self, key, break_time):
+    a, b = key
+    now = self._env.time_elapsed
+    self._links[key] = break_time
+    car_a, car_b = self._car_list[a], self._car_list[b]
+    car_a.setLinkLife(car_b._label, break_time - now)
+    car_b.setLinkLife(car_a._label, break_time - now)
+    if break_time < math.inf:
+      self._schedule(key, break_time - now, partial(self._break, key), "Link break")
+
+  def _break(self, key):
+    a, b = key
+    self._links.pop(key, None)
+    car_a, car_b = self._car_list[a], self._car_list[b]
+    car_a._linkLife.pop(car_b._label, None)
+    car_b._linkLife.pop(car_a._label, None)
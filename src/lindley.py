@@ -0,0 +1,159 @@
+import numpy as np
+
+from .discrete import Environment
+from .queue import Queue
+from .stats import DelayStats
+
+def lindley_waits(interarrivals, services, backlog = 0.):
+  """
+  Waiting times of a single server FIFO queue, straight from the Lindley recursion
+    W_k = max(0, W_{k-1} + S_{k-1} - A_k)
+  computed as W_n = C_n - min(0, min_{j<=n} C_j) over the running sum C of the increments.
+  BACKLOG is the work left in the system (W + S of the previous packet) when the first
+  inter-arrival time starts. Returns (waits, backlog after the last packet)
+  """
+  interarrivals = np.asarray(interarrivals, dtype=np.float64)
+  services = np.asarray(services, dtype=np.float64)
+  increments = np.empty(len(interarrivals))
+  if not len(increments):
+    return increments, backlog
+  increments[0] = backlog - interarrivals[0]
+  increments[1:] = services[:-1] - interarrivals[1:]
+  c = np.cumsum(increments)
+  waits = c - np.minimum(np.minimum.accumulate(c), 0)
+  return waits, waits[-1] + services[-1]
+
+
+class LindleyEngine(object):
+  """
+  Vectorized single server FIFO simulation for a Queue model
+  Inter-arrival and service times are drawn in blocks with the model's sample_interarrivals
+  and sample_services, waits come from lindley_waits, and the exact time-average number in
+  system from sorting each block's arrivals and departures. No event loop is involved, and
+  memory stays bounded by the block size
+  """
+  def __init__(self, model, rng = None, block = 1 << 20, hist_bins = 10000):
+    self.model = model
+    self.rng = rng if rng is not None else np.random.default_rng()
+    self.block = block
+    self.hist_bins = hist_bins
+
+  def run(self, N):
+    def blocks():
+      left = N
+      while left > 0:
+        n = min(left, self.block)
+        left -= n
+        yield self.model.sample_interarrivals(n, self.rng), self.model.sample_services(n, self.rng)
+    return self.run_blocks(blocks())
+
+  def run_blocks(self, blocks):
+    # BLOCKS yields (interarrivals, services) array pairs
+    wait = sojourn = service = None
+    backlog = 0.
+    last_arrival = 0.
+    # Occupancy bookkeeping carried between blocks
+    pending = np.empty(0)
+    in_system = 0
+    last_event = 0.
+    occupancy = np.zeros(1)
+
+    blocks = iter(blocks)
+    current = next(blocks, None)
+    while current is not None:
+      a, s = (np.asarray(x, dtype=np.float64) for x in current)
+      current = next(blocks, None)
+      if wait is None:
+        # Same bins as the event driven Queue, models without a known mean service time
+        # (e.g. replayed samples) fall back on the first block's mean
+        width = self.model.histogram_width() or float(s.mean()) / 10 or 1.
+        wait, service, sojourn = (DelayStats(width, self.hist_bins) for _ in range(3))
+
+      arrivals = last_arrival + np.cumsum(a)
+      last_arrival = arrivals[-1]
+      waits, backlog = lindley_waits(a, s, backlog)
+      wait.add_many(waits)
+      service.add_many(s)
+      sojourn.add_many(waits + s)
+
+      # Departures are in order (FIFO), so everything up to the block's last arrival can be
+      # settled now and the rest waits for the next block
+      departures = np.concatenate((pending, arrivals + waits + s))
+      cut = len(departures) if current is None else np.searchsorted(departures, last_arrival, side="right")
+      pending = departures[cut:]
+      times = np.concatenate((arrivals, departures[:cut]))
+      steps = np.concatenate((np.ones(len(arrivals), dtype=np.int64), -np.ones(cut, dtype=np.int64)))
+      order = np.argsort(times, kind="stable")
+      times, steps = times[order], steps[order]
+      after = in_system + np.cumsum(steps)
+      before = np.concatenate(([in_system], after[:-1]))
+      durations = np.diff(np.concatenate(([last_event], times)))
+      block_occupancy = np.bincount(np.maximum(before, 0), weights=durations)
+      if len(block_occupancy) > len(occupancy):
+        occupancy = np.concatenate((occupancy, np.zeros(len(block_occupancy) - len(occupancy))))
+      occupancy[:len(block_occupancy)] += block_occupancy
+      in_system = int(after[-1])
+      last_event = float(times[-1])
+
+    total = occupancy.sum()
+    dist = (occupancy / total).tolist() if total else []
+    return {"packets": wait.moments.n if wait else 0,
+            "wait": wait.summary() if wait else None,
+            "service": service.summary() if service else None,
+            "sojourn": sojourn.summary() if sojourn else None,
+            "avg_in_system": sum(i * p for i, p in enumerate(dist)),
+            "occupancy": dist}
+
+
+class ReplayQueue(Queue):
+  """Queue whose inter-arrival and service times are replayed from given sequences"""
+  def __init__(self, env, interarrivals, services, **kwargs):
+    super().__init__(env, **kwargs)
+    self._interarrivals = iter(interarrivals)
+    self._services = iter(services)
+
+  @property
+  def arrival_rate(self):
+    return float(next(self._interarrivals))
+
+  @property
+  def service_rate(self):
+    return float(next(self._services))
+
+
+def cross_check(model, N, seed = None, rtol = 1e-6):
+  """
+  Draws N inter-arrival and service times from MODEL once, runs both the event driven
+  Queue and the LindleyEngine on them and compares the results.
+  Returns a dict with both summaries, the largest relative difference found and whether
+  it is within RTOL
+  """
+  rng = np.random.default_rng(seed)
+  a = model.sample_interarrivals(N, rng)
+  s = model.sample_services(N, rng)
+
+  fast = LindleyEngine(model).run_blocks([(a, s)])
+  env = Environment()
+  replay = ReplayQueue(env, a, s)
+  replay.generate_arrival_events(N)
+  env.run()
+  des = replay.summary()
+
+  def rel(x, y):
+    scale = max(abs(x), abs(y))
+    return abs(x - y) / scale if scale else 0.
+
+  diffs = {"packets": rel(fast["packets"], des["packets"]),
+           "avg_in_system": rel(fast["avg_in_system"], des["avg_in_system"])}
+  for metric in ["wait", "service", "sojourn"]:
+    for key in ["mean", "std", "max"]:
+      diffs["{}.{}".format(metric, key)] = rel(fast[metric][key], des[metric][key])
+  # Zero duration states (ties) can leave trailing zeros on either side
+  n = max(len(fast["occupancy"]), len(des["occupancy"]))
+  for i in range(n):
+    x = fast["occupancy"][i] if i < len(fast["occupancy"]) else 0.
+    y = des["occupancy"][i] if i < len(des["occupancy"]) else 0.
+    diffs["occupancy[{}]".format(i)] = abs(x - y)
+  worst = max(diffs, key=diffs.get)
+  return {"des": des, "fast": fast, "diffs": diffs, "worst": worst,
+          "max_error": diffs[worst], "ok": diffs[worst] <= rtol}
@@ -1,77 +1,222 @@
+import numpy as np
 from tabulate import tabulate
-from random import random
+
+from .buffer import PacketBuffer, PacketTrace
+from .discrete import Source
+from .stats import BatchMeans, DelayStats, Histogram
+
+class ArrivalTimes(object):
+  """Absolute times of the next N arrivals of QUEUE, drawn as they are needed"""
+  # An iterator object rather than a generator so a pending arrival Source can be pickled
+  def __init__(self, queue, start, N):
+    self.queue = queue
+    self.t = start
+    self.left = N
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    if self.left <= 0:
+      raise StopIteration
+    self.left -= 1
+    self.t += self.queue.arrival_rate
+    return self.t
+
 
 class Queue(object):
   """Queue discrete time simulator"""
-  def __init__(self, env):
+  def __init__(self, env, keep_trace = False, hist_width = None, hist_bins = 100):
     self.env = env
-    self.packets = []
+    self.packets = PacketBuffer()
     self.in_use = False
     self.curr_pkt = None
-    self.all_pkts = []
-    self.pkt_count = []
+    # Every served packet is only kept with KEEP_TRACE, the streaming stats below are
+    # always updated at departure time
+    self.keep_trace = keep_trace
+    self.all_pkts = PacketTrace()
+    # Histogram bin width, worked out at the first departure if not given (see histogram_width)
+    self._hist_width = hist_width
+    self.wait_stats = DelayStats(hist_width, hist_bins)
+    self.service_stats = DelayStats(hist_width, hist_bins)
+    self.sojourn_stats = DelayStats(hist_width, hist_bins)
+    # Metric -> BatchMeans for steady state estimates, see track()
+    self.batch_means = {}
+    # occupancy_time[i] is the total time spent with exactly i packets in the system
+    self.occupancy_time = []
+    self._last_change = env.time_elapsed
+
+  def _record_occupancy(self):
+    # Called right before the number of packets in the system changes
+    now = self.env.time_elapsed
+    i = len(self.packets) + self.in_use
+    while len(self.occupancy_time) <= i:
+      self.occupancy_time.append(0)
+    self.occupancy_time[i] += now - self._last_change
+    self._last_change = now
 
   def enqueue_packet(self):
     # Packet format: (service time, queueing start time, queueing stop time)
+    self._record_occupancy()
     service_time = self.service_rate
-    pkt = (service_time, self.env.time_elapsed, None)
+    pkt = (service_time, self.env.time_elapsed, float("nan"))
     self.packets.append(pkt)
     self.service_packet()
 
   def service_packet(self):
     if not self.in_use and len(self.packets):
-      pkt = self.packets.pop(0)
+      pkt = self.packets.popleft()
       self.curr_pkt = pkt[0], pkt[1], self.env.time_elapsed
       service_time = pkt[0]
       self.env.add_event(self.finish_serving_packet, service_time, "Packet Departure")
       self.in_use = True
 
   def finish_serving_packet(self):
-    self.all_pkts.append(self.curr_pkt)
+    self._record_occupancy()
+    self._record_packet(self.curr_pkt)
     self.curr_pkt = None
     self.in_use = False
     self.service_packet()
 
+  def _record_packet(self, pkt):
+    service, arrival, start = pkt
+    wait = start - arrival
+    if self._hist_width is None:
+      # Not known at construction, subclasses set their parameters after Queue.__init__
+      self._hist_width = (self.wait_stats.hist_bins and self.histogram_width()) or 0
+      if self._hist_width:
+        for stats in [self.wait_stats, self.service_stats, self.sojourn_stats]:
+          stats.histogram = Histogram(self._hist_width, stats.hist_bins)
+    self.wait_stats.add(wait)
+    self.service_stats.add(service)
+    self.sojourn_stats.add(wait + service)
+    if self.batch_means:
+      values = {"wait": wait, "service": service, "sojourn": wait + service}
+      for metric, batches in self.batch_means.items():
+        batches.add(values[metric])
+    if self.keep_trace:
+      self.all_pkts.append(pkt)
+
+  def histogram_width(self):
+    # Default histogram bin width: a tenth of the model's mean service time, so bins are the
+    # same whatever the seed. None (no histograms) if the model doesn't know its mean
+    service = self.expected_values().get("service")
+    return service / 10 if service else None
+
+  def summary(self):
+    # Streaming statistics of the run so far, no pass over the packets needed
+    return {"packets": self.wait_stats.moments.n,
+            "wait": self.wait_stats.summary(),
+            "service": self.service_stats.summary(),
+            "sojourn": self.sojourn_stats.summary(),
+            "avg_in_system": self.average_in_system(),
+            "occupancy": self.occupancy_distribution()}
+
+  def track(self, metric, batch_size = 10):
+    # Starts keeping batch means of METRIC ("wait", "service" or "sojourn") for steady_state
+    self.batch_means[metric] = BatchMeans(batch_size)
+
+  def steady_state(self, metric, confidence = .95):
+    # Mean of METRIC with the warm-up transient cut off (MSER) and its confidence interval
+    # half width from batch means
+    return self.batch_means[metric].estimate(confidence)
+
+  def run_until_precision(self, metric, rel_halfwidth, confidence = .95, max_packets = 10**7,
+                          check_every = 1000, batches = 30):
+    """
+    Simulates packets until the CONFIDENCE interval of the steady state mean of METRIC is
+    within REL_HALFWIDTH of the mean (or MAX_PACKETS have been served), checking every
+    CHECK_EVERY packets. Returns the steady_state estimate with "converged" set
+    """
+    if metric not in self.batch_means:
+      self.track(metric)
+    stats = self.batch_means[metric]
+    self.generate_arrival_events(max_packets)
+    estimate = {}
+    next_check = stats.n + check_every
+
+    def precise():
+      nonlocal estimate, next_check
+      if stats.n < next_check:
+        return False
+      next_check += check_every
+      estimate = stats.estimate(confidence, batches)
+      return estimate["batches"] >= batches and estimate["halfwidth"] <= rel_halfwidth * abs(estimate["mean"])
+
+    converged = self.env.run_until(precise)
+    self.arrivals.stop()
+    if not converged:
+      estimate = stats.estimate(confidence, batches)
+    estimate["converged"] = converged
+    return estimate
+
   def generate_arrival_events(self, N):
-    t = 0
-    for _ in range(N):
-      t += self.arrival_rate
-      self.env.add_event(self.enqueue_packet, t, "Packet Arrival")
+    # Arrivals are a Source, so only the next one is ever pending and inter-arrival
+    # times are drawn as the run goes
+    self.arrivals = Source(self.env, self.arrival_times(N), self.enqueue_packet, "Packet Arrival").start()
 
-    for i in range(1, int(t*20)):
-      salty = i/20 + random()/100
-      self.env.add_event(self.log_stats, salty, "Logging statistics")
+  def arrival_times(self, N):
+    return ArrivalTimes(self, self.env.time_elapsed, N)
 
-  def log_stats(self):
-    i = len(self.packets) + self.in_use
-    try:
-      self.pkt_count[i] += 1
-    except IndexError:
-      self.pkt_count.append(0)
-      self.log_stats()
+  def occupancy_distribution(self):
+    # Exact time-average distribution of the number of packets in the system so far
+    self._record_occupancy()
+    total = sum(self.occupancy_time)
+    if not total:
+      return []
+    return [t/total for t in self.occupancy_time]
+
+  def average_in_system(self):
+    return sum(i * p for i, p in enumerate(self.occupancy_distribution()))
 
   def print_distribution(self):
-    total_dist = sum(self.pkt_count)
+    dist = self.occupancy_distribution()
     print("Distribution of number of packets in the system")
     headers = ["#Pkts", "Actual", "Expected", "Error (%)"]
     tbl = []
-    avg_count = 0
-    for i, count in enumerate(self.pkt_count):
-      avg_count += i * count/total_dist
-      actual_dist = count
-      expected_dist = int(self.expected_dist(i) * total_dist)
+    for i, actual_dist in enumerate(dist[:8]):
+      expected_dist = self.expected_dist(i)
       try:
         err = (actual_dist - expected_dist)/expected_dist
       except ZeroDivisionError:
         err = 0
-      if i < 8:
-        tbl.append([i, actual_dist/total_dist, expected_dist/total_dist, err])
+      except TypeError:
+        # The model has no analytic distribution
+        err = None
+      tbl.append([i, actual_dist, expected_dist, err])
     print(tabulate(tbl, headers=headers, tablefmt="fancy_grid", floatfmt=".4f"))
-    print("Average number in system: {}".format(avg_count))
+    print("Average number in system: {}".format(sum(i * p for i, p in enumerate(dist))))
+
+
+  def sample_interarrivals(self, n, rng):
+    # Block of N inter-arrival times for the vectorized engine (src/lindley.py). Subclasses
+    # should override this with a draw from the NumPy generator RNG, the default just
+    # calls arrival_rate N times
+    return np.fromiter((self.arrival_rate for _ in range(n)), dtype=np.float64, count=n)
+
+  def sample_services(self, n, rng):
+    # Block of N service times, see sample_interarrivals
+    return np.fromiter((self.service_rate for _ in range(n)), dtype=np.float64, count=n)
 
+  def run_fast(self, N, seed = None, **kwargs):
+    # Simulates N packets with the Lindley recursion instead of the event loop (single
+    # server FIFO only) and returns the same summary as summary()
+    from .lindley import LindleyEngine
+    return LindleyEngine(self, np.random.default_rng(seed), **kwargs).run(N)
+
+  def cross_check(self, N, seed = None, rtol = 1e-6):
+    # Runs both engines on the same random streams, see lindley.cross_check
+    from .lindley import cross_check
+    return cross_check(self, N, seed, rtol)
 
   def expected_dist(self, i):
-    return 0
+    # Analytic probability of I packets in the system, None if the model doesn't know it
+    return None
+
+  def expected_values(self):
+    # Analytic means of the summary() metrics that are known for the model, keyed "wait",
+    # "service", "sojourn" or "avg_in_system"
+    return {}
 
   @property
   def arrival_rate(self):
@@ -0,0 +1,156 @@
+import os
+from collections import deque, namedtuple
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from .spatial import GridIndex
+
+# One frame of a vehicle animation: an (N, 2) array of car positions and the (i, j, dist)
+# arrays of car pairs linked in that frame
+Frame = namedtuple("Frame", ["positions", "links"])
+
+def capture_frame(cars, radius):
+  # Positions and links of CARS right now, then drives every car one step
+  positions = np.array([c.position() for c in cars], dtype=np.float64).reshape(-1, 2)
+  if len(positions) > 1:
+    links = GridIndex(positions, radius).pairs_within(radius)
+  else:
+    empty = np.empty(0, dtype=np.int64)
+    links = (empty, empty, np.empty(0))
+  for c in cars:
+    try:
+      c.drive()
+    except Exception:
+      # Already at its destination
+      pass
+  return Frame(positions, links)
+
+
+def capture(sg, frames, radius):
+  # Simulation stage: yields FRAMES Frames of the cars of street graph SG, one per step
+  cars = list(sg._car_index.values())
+  for _ in range(frames):
+    yield capture_frame(cars, radius)
+
+
+class FrameRenderer(object):
+  """
+  Draws Frames into RGB arrays without touching the disk or a display
+  The figure, grid and axes are drawn once on a bare Agg canvas and kept as the background.
+  Car markers, link lines and distance labels are created once too, and for every frame
+  only their data is updated before they are blitted over the background
+  """
+  def __init__(self, size = 15, figsize = (6.4, 4.8), dpi = 100):
+    # Only the visualization needs matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    self.figure = Figure(figsize = figsize, dpi = dpi)
+    self.canvas = FigureCanvasAgg(self.figure)
+    ax = self.ax = self.figure.add_subplot(1, 1, 1)
+    ticks = range(0, size + 1)
+    ax.grid(True)
+    ax.set_xticks(ticks)
+    ax.set_yticks(ticks)
+    ax.set_xlim(0, size)
+    ax.set_ylim(0, size)
+
+    self._links = LineCollection([], colors = 'r', animated = True)
+    ax.add_collection(self._links)
+    self._cars, = ax.plot([], [], 'bo', animated = True)
+    # Distance labels, grown as needed and hidden when unused
+    self._labels = []
+    self.canvas.draw()
+    self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+  def _label(self, k):
+    while len(self._labels) <= k:
+      self._labels.append(self.ax.text(0, 0, "", animated = True))
+    return self._labels[k]
+
+  def render(self, frame):
+    positions, (i, j, dist) = frame
+    self._cars.set_data(positions[:, 0], positions[:, 1])
+    self._links.set_segments(np.stack((positions[i], positions[j]), axis = 1))
+    mids = (positions[i] + positions[j]) / 2
+    for k, ((x, y), d) in enumerate(zip(mids.tolist(), dist.tolist())):
+      label = self._label(k)
+      label.set_position((x, y))
+      label.set_text(str(round(d, 2)))
+      label.set_visible(True)
+    for label in self._labels[len(dist):]:
+      label.set_visible(False)
+
+    self.canvas.restore_region(self._background)
+    self.ax.draw_artist(self._cars)
+    self.ax.draw_artist(self._links)
+    for label in self._labels[:len(dist)]:
+      self.ax.draw_artist(label)
+    return np.asarray(self.canvas.buffer_rgba())[:, :, :3].copy()
+
+
+def open_writer(path, interval = .1):
+  # imageio writer for PATH, a GIF or (through ffmpeg) any video format such as .mp4,
+  # showing each frame for INTERVAL seconds
+  import imageio
+  if os.path.splitext(path)[1].lower() == ".gif":
+    # The legacy Pillow GIF writer streams frames out as they come (the default one keeps
+    # them all until closing), and the fast octree quantizer is ~5x quicker than median cut
+    return imageio.get_writer(path, format = "GIF-PIL", mode = 'I', duration = interval, quantizer = 2)
+  return imageio.get_writer(path, fps = 1 / interval)
+
+# Renderer each worker process draws with, built once by _init_renderer
+_renderer = None
+
+def _init_renderer(renderer_args):
+  global _renderer
+  _renderer = FrameRenderer(**renderer_args) if renderer_args is not None else None
+
+def _render_chunk(frames):
+  return [_renderer.render(frame) for frame in frames]
+
+def write_frames(frames, path, interval = .1, processes = None, chunk_size = 32, **renderer_args):
+  """
+  Rendering stage: draws the Frames coming out of FRAMES into PATH, in order.
+  Frames are handed to a pool of PROCESSES workers (all cores by default) in chunks of
+  CHUNK_SIZE, and at most two chunks per worker are in flight, so memory stays bounded
+  however long the run is and the simulation never gets far ahead of the writer.
+  With a single process everything is drawn here
+  """
+  processes = processes or cpu_count()
+  frames = iter(frames)
+  chunks = iter(lambda: list(islice(frames, chunk_size)), [])
+  written = 0
+  with open_writer(path, interval) as writer:
+    if processes <= 1:
+      _init_renderer(renderer_args)
+      try:
+        for chunk in chunks:
+          for image in _render_chunk(chunk):
+            writer.append_data(image)
+            written += 1
+      finally:
+        _init_renderer(None)
+      return written
+    with Pool(processes, _init_renderer, (renderer_args,)) as pool:
+      pending = deque()
+      def flush():
+        nonlocal written
+        for image in pending.popleft().get():
+          writer.append_data(image)
+          written += 1
+      for chunk in chunks:
+        pending.append(pool.apply_async(_render_chunk, (chunk,)))
+        if len(pending) >= 2 * processes:
+          flush()
+      while pending:
+        flush()
+  return written
+
+def animate(sg, frames, path, radius = 3, interval = .1, processes = None, **renderer_args):
+  # Drives the cars of street graph SG for FRAMES steps and renders them into PATH
+  frames = capture(sg, frames, radius)
+  return write_frames(frames, path, interval, processes, **renderer_args)
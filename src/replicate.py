@@ -0,0 +1,107 @@
+import math
+import random
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+from tabulate import tabulate
+
+from .discrete import Environment
+from .stats import RunningStats, confidence_interval
+
+DELAYS = ["wait", "service", "sojourn"]
+
+def _replicate(job):
+  # One independent replication: fresh Environment and model, seeded from its own stream
+  factory, N, seq, fast = job
+  # The scripts draw from the random module, the fast path from a NumPy generator
+  random.seed(int(seq.generate_state(1, np.uint64)[0]))
+  env = Environment()
+  model = factory(env)
+  if fast:
+    return model.run_fast(N, seed=seq)
+  model.generate_arrival_events(N)
+  env.run()
+  return model.summary()
+
+
+class Replications(object):
+  """
+  Results of independent replications of one queue model
+  Every metric is averaged over the replications, with a t confidence interval built
+  from the spread of the per-replication values
+  """
+  def __init__(self, summaries, expected, confidence = .95, states = 8):
+    self.summaries = summaries
+    self.confidence = confidence
+    self.expected = expected
+    # Per-replication values of every reported metric
+    self.samples = {}
+    for name in DELAYS:
+      self.samples[name] = [s[name]["mean"] for s in summaries]
+    self.samples["wait p99"] = [s["wait"]["p99"] for s in summaries]
+    self.samples["avg_in_system"] = [s["avg_in_system"] for s in summaries]
+    for i in range(states):
+      self.samples["P({} in system)".format(i)] = [s["occupancy"][i] if i < len(s["occupancy"]) else 0.
+                                                   for s in summaries]
+    self.intervals = {name: confidence_interval(xs, confidence) for name, xs in self.samples.items()}
+    # Every packet of every replication pooled together
+    self.pooled = {}
+    for name in DELAYS:
+      stats = RunningStats()
+      for s in summaries:
+        stats = stats.merge(RunningStats.from_summary(s[name]))
+      self.pooled[name] = stats
+
+  def __len__(self):
+    return len(self.summaries)
+
+  def table(self):
+    rows = []
+    # Deterministic metrics have zero width intervals, and a run of N packets still differs
+    # from steady state by O(1/N) (the first arrival, the last departure), so a match is
+    # also accepted within that relative tolerance
+    packets = min((s["packets"] for s in self.summaries), default=0)
+    tolerance = 10 / packets if packets else 0
+    for name, (mean, half) in self.intervals.items():
+      expected = self.expected.get(name)
+      if expected is None:
+        covered = ""
+      else:
+        hit = abs(mean - expected) <= half or math.isclose(mean, expected, rel_tol=tolerance, abs_tol=1e-12)
+        covered = "yes" if hit else "no"
+      rows.append([name, mean, half, mean - half, mean + half, expected, covered])
+    return rows
+
+  def print_table(self):
+    print("{} replications, {:g}% confidence intervals".format(len(self), 100 * self.confidence))
+    headers = ["Metric", "Mean", "+/-", "Low", "High", "Expected", "Covered"]
+    print(tabulate(self.table(), headers=headers, tablefmt="fancy_grid", floatfmt=".6f"))
+
+
+def replicate(factory, N, R, seed = None, processes = None, fast = False, confidence = .95, states = 8):
+  """
+  Runs R independent replications of N packets each. FACTORY builds the model from an
+  Environment, e.g. functools.partial(MM1Queue, lamb, mu), and has to be picklable.
+  Each replication gets its own stream spawned from SEED, so results don't depend on
+  PROCESSES (all cores by default). With FAST the Lindley engine (Queue.run_fast)
+  replaces the event loop. Expected values come from the model's expected_values() and
+  expected_dist() (where it isn't None), and the first STATES occupancy probabilities
+  are reported
+  """
+  seqs = np.random.SeedSequence(seed).spawn(R)
+  jobs = [(factory, N, seq, fast) for seq in seqs]
+
+  processes = min(processes or cpu_count(), R)
+  if processes <= 1:
+    summaries = list(map(_replicate, jobs))
+  else:
+    with Pool(processes) as pool:
+      summaries = pool.map(_replicate, jobs, chunksize=1)
+
+  model = factory(Environment())
+  expected = dict(model.expected_values())
+  for i in range(states):
+    p = model.expected_dist(i)
+    if p is not None:
+      expected["P({} in system)".format(i)] = p
+  return Replications(summaries, expected, confidence, states)
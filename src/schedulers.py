@@ -0,0 +1,120 @@
+from bisect import insort
+from heapq import heapify, heappop, heappush
+
+class HeapScheduler(object):
+  """Binary heap of pending events, O(log n) per operation. The default backend"""
+  def __init__(self):
+    self._heap = []
+
+  def __len__(self):
+    return len(self._heap)
+
+  def push(self, entry):
+    heappush(self._heap, entry)
+
+  def pop(self):
+    # Raises IndexError when empty
+    return heappop(self._heap)
+
+  def entries(self):
+    return list(self._heap)
+
+  def compact(self):
+    # Drops cancelled entries (those whose event slot was cleared)
+    self._heap = [entry for entry in self._heap if entry[2] is not None]
+    heapify(self._heap)
+
+
+class CalendarQueue(object):
+  """
+  Calendar queue (R. Brown, 1988): pending events hashed by time into a ring of buckets,
+  each one "day" wide, like appointments in a desk calendar. Dequeueing walks the days
+  of the current year in order, so with a bucket width matching the typical gap between
+  events both enqueue and dequeue are amortized O(1). The number of buckets follows the
+  number of events and the width is re-estimated from the upcoming events on every resize
+  """
+  MIN_BUCKETS = 2
+  # Number of upcoming events sampled to estimate the bucket width
+  WIDTH_SAMPLE = 25
+
+  def __init__(self, width = 1.0):
+    self._width = width
+    self._size = 0
+    self._setup(self.MIN_BUCKETS, width, 0.0)
+
+  def __len__(self):
+    return self._size
+
+  def _setup(self, nbuckets, width, start):
+    self._nbuckets = nbuckets
+    self._width = width
+    self._buckets = [[] for _ in range(nbuckets)]
+    # Bucket the search resumes at, and the end of that bucket's day in the current year
+    day = int(start / width)
+    self._current = day % nbuckets
+    self._bucket_top = (day + 1) * width
+    self._last_time = start
+    self._grow_at = 2 * nbuckets
+    self._shrink_at = nbuckets // 2 - 2
+
+  def push(self, entry):
+    insort(self._buckets[int(entry[0] / self._width) % self._nbuckets], entry)
+    self._size += 1
+    if self._size > self._grow_at:
+      self._resize(2 * self._nbuckets)
+
+  def pop(self):
+    # Raises IndexError when empty
+    if not self._size:
+      raise IndexError("pop from empty calendar queue")
+    buckets, n, width = self._buckets, self._nbuckets, self._width
+    i, top = self._current, self._bucket_top
+    for _ in range(n):
+      bucket = buckets[i]
+      if bucket and bucket[0][0] < top:
+        return self._take(i, top)
+      i += 1
+      top += width
+      if i == n:
+        i = 0
+    # Nothing this year: jump straight to the earliest event
+    i = min((b[0][0], j) for j, b in enumerate(buckets) if b)[1]
+    top = (int(buckets[i][0][0] / width) + 1) * width
+    return self._take(i, top)
+
+  def _take(self, i, top):
+    entry = self._buckets[i].pop(0)
+    self._current, self._bucket_top = i, top
+    self._last_time = entry[0]
+    self._size -= 1
+    if self._size < self._shrink_at:
+      self._resize(self._nbuckets // 2)
+    return entry
+
+  def _estimate_width(self, entries):
+    # Brown's heuristic: three times the average gap between the next few events,
+    # ignoring gaps much bigger than average
+    times = [entry[0] for entry in entries[:self.WIDTH_SAMPLE]]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    if not gaps:
+      return self._width
+    avg = sum(gaps) / len(gaps)
+    small = [g for g in gaps if g <= 2 * avg]
+    avg = sum(small) / len(small) if small else avg
+    return 3 * avg if avg > 0 else self._width
+
+  def _resize(self, nbuckets):
+    nbuckets = max(nbuckets, self.MIN_BUCKETS)
+    entries = sorted(entry for bucket in self._buckets for entry in bucket)
+    self._setup(nbuckets, self._estimate_width(entries), self._last_time)
+    for entry in entries:
+      self._buckets[int(entry[0] / self._width) % nbuckets].append(entry)
+
+  def entries(self):
+    return [entry for bucket in self._buckets for entry in bucket]
+
+  def compact(self):
+    for bucket in self._buckets:
+      bucket[:] = [entry for entry in bucket if entry[2] is not None]
+    self._size = sum(len(bucket) for bucket in self._buckets)
+    self._resize(self._nbuckets)
@@ -0,0 +1,84 @@
+import numpy as np
+
+# Offsets to the neighbor cells each cell is joined with. Only half of the 8 surrounding
+# cells are needed, the other half is covered when the roles are swapped
+_HALF_NEIGHBORHOOD = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+class GridIndex(object):
+  """
+  Uniform grid over a set of 2D points for radius queries
+  Points are bucketed into square cells of CELL_SIZE and sorted by cell, so everything
+  within CELL_SIZE of a point lies in its own or one of the 8 surrounding cells.
+  Cheap enough to rebuild every tick
+  """
+  def __init__(self, points, cell_size):
+    self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    self.cell_size = float(cell_size)
+    if self.cell_size <= 0:
+      raise ValueError("cell_size must be positive")
+    cells = np.floor(self.points / self.cell_size).astype(np.int64)
+    self._cx, self._cy = cells[:, 0], cells[:, 1]
+    self.order = np.argsort(self._key(self._cx, self._cy), kind="stable")
+    self._sorted_keys = self._key(self._cx, self._cy)[self.order]
+
+  @staticmethod
+  def _key(cx, cy):
+    # Packs a cell coordinate into one sortable integer
+    return (cx << 32) + (cy & 0xffffffff)
+
+  def _cell_range(self, cx, cy):
+    key = self._key(cx, cy)
+    return (np.searchsorted(self._sorted_keys, key, side="left"),
+            np.searchsorted(self._sorted_keys, key, side="right"))
+
+  def pairs_within(self, radius = None):
+    """
+    Returns (i, j, dist) arrays for every pair of points i < j at most RADIUS apart.
+    RADIUS defaults to, and may not exceed, the cell size
+    """
+    radius = self.cell_size if radius is None else radius
+    if radius > self.cell_size:
+      raise ValueError("radius {} is larger than the cell size {}".format(radius, self.cell_size))
+    n = len(self.points)
+    all_i, all_j = [], []
+    for dx, dy in _HALF_NEIGHBORHOOD:
+      start, stop = self._cell_range(self._cx + dx, self._cy + dy)
+      counts = stop - start
+      total = counts.sum()
+      if not total:
+        continue
+      # Expand every point against each point of its neighbor cell
+      i = np.repeat(np.arange(n), counts)
+      first = np.repeat(start - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+      j = self.order[first + np.arange(total)]
+      if (dx, dy) == (0, 0):
+        keep = i < j
+        i, j = i[keep], j[keep]
+      all_i.append(i)
+      all_j.append(j)
+    if not all_i:
+      empty = np.empty(0, dtype=np.int64)
+      return empty, empty, np.empty(0)
+    i, j = np.concatenate(all_i), np.concatenate(all_j)
+    d = np.hypot(*(self.points[i] - self.points[j]).T)
+    keep = d <= radius
+    i, j, d = i[keep], j[keep], d[keep]
+    swap = i > j
+    i[swap], j[swap] = j[swap], i[swap]
+    return i, j, d
+
+  def query(self, x, y, radius = None):
+    # Returns the indices of every point at most RADIUS from (x, y)
+    radius = self.cell_size if radius is None else radius
+    reach = int(np.ceil(radius / self.cell_size))
+    cx, cy = int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size))
+    found = []
+    for ox in range(cx - reach, cx + reach + 1):
+      start, stop = self._cell_range(np.int64(ox), np.arange(cy - reach, cy + reach + 1, dtype=np.int64))
+      for a, b in zip(start, stop):
+        found.append(self.order[a:b])
+    if not found:
+      return np.empty(0, dtype=np.int64)
+    found = np.concatenate(found)
+    d = np.hypot(self.points[found, 0] - x, self.points[found, 1] - y)
+    return np.sort(found[d <= radius])
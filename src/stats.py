@@ -0,0 +1,304 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+def t_quantile(p, df):
+  # Student t P-quantile with DF degrees of freedom. Exact for 1 and 2, otherwise Hill's
+  # (1970) expansion around the normal quantile, within 1% from 3 degrees of freedom on
+  if df == 1:
+    return math.tan(math.pi * (p - .5))
+  if df == 2:
+    return (2*p - 1) / math.sqrt(2 * p * (1 - p))
+  z = NormalDist().inv_cdf(p)
+  g1 = (z**3 + z) / 4
+  g2 = (5*z**5 + 16*z**3 + 3*z) / 96
+  g3 = (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / 384
+  g4 = (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z) / 92160
+  return z + g1/df + g2/df**2 + g3/df**3 + g4/df**4
+
+def confidence_interval(xs, confidence = .95):
+  # (mean, half width) of the t confidence interval for the mean of independent samples XS
+  n = len(xs)
+  mean = sum(xs) / n
+  if n < 2:
+    return mean, math.inf
+  std = math.sqrt(sum((x - mean)**2 for x in xs) / (n - 1))
+  return mean, t_quantile(.5 + confidence / 2, n - 1) * std / math.sqrt(n)
+
+
+def mser(xs, batch = 5):
+  # Warm-up truncation point by MSER-BATCH (White, 1997): how many leading observations to
+  # drop so the rest has the smallest squared standard error of the mean. Observations are
+  # averaged BATCH at a time and only truncating up to half of them is considered
+  xs = np.asarray(xs, dtype=np.float64)
+  k = len(xs) // batch
+  if k < 2:
+    return 0
+  means = xs[:k * batch].reshape(k, batch).mean(axis=1)
+  # Suffix sums give the sum of squared deviations of means[d:] for every d at once
+  n = np.arange(k, 0, -1)
+  s1 = np.cumsum(means[::-1])[::-1]
+  s2 = np.cumsum((means**2)[::-1])[::-1]
+  stat = np.maximum(s2 - s1**2 / n, 0) / n**2
+  return int(np.argmin(stat[:k // 2 + 1])) * batch
+
+
+class RunningStats(object):
+  """Streaming count, mean, variance, min and max using Welford's algorithm"""
+  def __init__(self):
+    self.n = 0
+    self.mean = 0.
+    self._m2 = 0.
+    self.min = math.inf
+    self.max = -math.inf
+
+  def add(self, x):
+    self.n += 1
+    delta = x - self.mean
+    self.mean += delta / self.n
+    self._m2 += delta * (x - self.mean)
+    if x < self.min:
+      self.min = x
+    if x > self.max:
+      self.max = x
+
+  def add_many(self, xs):
+    # Folds a whole array of samples in at once
+    xs = np.asarray(xs, dtype=np.float64)
+    if not len(xs):
+      return
+    block = RunningStats()
+    block.n = len(xs)
+    block.mean = float(xs.mean())
+    block._m2 = float(((xs - block.mean)**2).sum())
+    block.min = float(xs.min())
+    block.max = float(xs.max())
+    merged = self.merge(block)
+    self.n, self.mean, self._m2, self.min, self.max = merged.n, merged.mean, merged._m2, merged.min, merged.max
+
+  @classmethod
+  def from_summary(cls, summary):
+    # Rebuilds the moments from a DelayStats.summary() dict
+    out = cls()
+    out.n = summary["n"]
+    if out.n:
+      out.mean = summary["mean"]
+      out._m2 = summary["std"]**2 * (out.n - 1)
+      out.min = summary["min"]
+      out.max = summary["max"]
+    return out
+
+  @property
+  def variance(self):
+    # Sample variance
+    return self._m2 / (self.n - 1) if self.n > 1 else 0.
+
+  @property
+  def std(self):
+    return math.sqrt(self.variance)
+
+  def merge(self, other):
+    # Returns the stats of both sample sets combined (Chan et al.)
+    out = RunningStats()
+    out.n = self.n + other.n
+    if not out.n:
+      return out
+    delta = other.mean - self.mean
+    out.mean = self.mean + delta * other.n / out.n
+    out._m2 = self._m2 + other._m2 + delta**2 * self.n * other.n / out.n
+    out.min = min(self.min, other.min)
+    out.max = max(self.max, other.max)
+    return out
+
+
+class P2Quantile(object):
+  """
+  Streaming estimate of the P-quantile in constant memory, using the P-squared algorithm
+  (Jain and Chlamtac, 1985): five markers whose heights are nudged with a piecewise
+  parabolic fit as samples arrive
+  """
+  def __init__(self, p):
+    self.p = p
+    self.n = 0
+    self._q = []
+    self._pos = [1, 2, 3, 4, 5]
+    self._desired = [1, 1 + 2*p, 1 + 4*p, 3 + 2*p, 5]
+    self._step = [0, p/2, p, (1 + p)/2, 1]
+
+  def add(self, x):
+    self.n += 1
+    q = self._q
+    if self.n <= 5:
+      q.append(x)
+      q.sort()
+      return
+
+    if x < q[0]:
+      q[0] = x
+      k = 0
+    elif x >= q[4]:
+      q[4] = x
+      k = 3
+    else:
+      k = 0
+      while x >= q[k + 1]:
+        k += 1
+    pos, desired = self._pos, self._desired
+    for i in range(k + 1, 5):
+      pos[i] += 1
+    for i in range(5):
+      desired[i] += self._step[i]
+
+    for i in range(1, 4):
+      d = desired[i] - pos[i]
+      if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+        d = 1 if d > 0 else -1
+        height = self._parabolic(i, d)
+        if not q[i - 1] < height < q[i + 1]:
+          height = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+        q[i] = height
+        pos[i] += d
+
+  def _parabolic(self, i, d):
+    q, n = self._q, self._pos
+    return q[i] + d / (n[i + 1] - n[i - 1]) * (
+      (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+      (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+  def value(self):
+    if not self.n:
+      return math.nan
+    if self.n <= 5:
+      # Exact quantile of the few samples seen
+      return self._q[min(int(self.p * self.n), self.n - 1)]
+    return self._q[2]
+
+
+class Histogram(object):
+  """Fixed width bins starting at 0, with everything past the last bin counted as overflow"""
+  def __init__(self, width, nbins = 100):
+    self.width = width
+    self.counts = [0] * nbins
+    self.overflow = 0
+    self.n = 0
+
+  def add(self, x):
+    self.n += 1
+    i = int(x / self.width)
+    if i < len(self.counts):
+      self.counts[max(i, 0)] += 1
+    else:
+      self.overflow += 1
+
+  def add_many(self, xs):
+    idx = np.maximum((np.asarray(xs) / self.width).astype(np.int64), 0)
+    nbins = len(self.counts)
+    inside = idx < nbins
+    self.n += len(idx)
+    self.overflow += int(len(idx) - inside.sum())
+    block = np.bincount(idx[inside], minlength=nbins)
+    self.counts = [a + int(b) for a, b in zip(self.counts, block)]
+
+  def merge(self, other):
+    assert self.width == other.width and len(self.counts) == len(other.counts)
+    out = Histogram(self.width, len(self.counts))
+    out.counts = [a + b for a, b in zip(self.counts, other.counts)]
+    out.overflow = self.overflow + other.overflow
+    out.n = self.n + other.n
+    return out
+
+  def quantile(self, p):
+    # Interpolated within the bin the P-quantile falls in
+    target = p * self.n
+    seen = 0
+    for i, count in enumerate(self.counts):
+      if count and seen + count >= target:
+        return (i + (target - seen) / count) * self.width
+      seen += count
+    return math.inf
+
+
+class BatchMeans(object):
+  """
+  Means of consecutive batches of a sample stream, for steady state estimates in bounded
+  memory: once MAX_BATCHES batches are complete neighbors are merged pairwise and the
+  batch size doubles
+  """
+  def __init__(self, batch_size = 10, max_batches = 1024):
+    self.batch_size = batch_size
+    self.max_batches = max_batches
+    self.means = []
+    self.n = 0
+    self._sum = 0.
+    self._count = 0
+
+  def add(self, x):
+    self.n += 1
+    self._sum += x
+    self._count += 1
+    if self._count >= self.batch_size:
+      self.means.append(self._sum / self._count)
+      self._sum = 0.
+      self._count = 0
+      if len(self.means) == self.max_batches:
+        means = self.means
+        self.means = [(a + b) / 2 for a, b in zip(means[::2], means[1::2])]
+        self.batch_size *= 2
+
+  def estimate(self, confidence = .95, batches = 30):
+    # Mean and confidence interval half width after dropping the warm-up found by MSER.
+    # The remaining batch means are regrouped into BATCHES larger ones, which makes them
+    # close enough to independent for a t interval. The batch in progress is left out
+    warmup = mser(self.means, 1)
+    rest = self.means[warmup:]
+    size = len(rest) // batches
+    if size:
+      rest = np.asarray(rest[len(rest) - size * batches:]).reshape(batches, size).mean(axis=1).tolist()
+    mean, half = confidence_interval(rest, confidence) if rest else (math.nan, math.inf)
+    return {"mean": mean, "halfwidth": half, "batches": len(rest),
+            "warmup": warmup * self.batch_size, "n": self.n}
+
+
+class DelayStats(object):
+  """Streaming summary of one delay metric: moments, a few quantiles and a histogram"""
+  QUANTILES = [.5, .9, .99]
+
+  def __init__(self, hist_width = None, hist_bins = 100):
+    self.moments = RunningStats()
+    self.quantiles = {p: P2Quantile(p) for p in self.QUANTILES}
+    self.hist_bins = hist_bins
+    self.histogram = Histogram(hist_width, hist_bins) if hist_width else None
+
+  def add(self, x):
+    self.moments.add(x)
+    for q in self.quantiles.values():
+      q.add(x)
+    if self.histogram is not None:
+      self.histogram.add(x)
+
+  def add_many(self, xs):
+    # Batched update. P-squared can't be batched, so the quantiles of batched samples
+    # come from the histogram instead
+    self.moments.add_many(xs)
+    if self.histogram is not None:
+      self.histogram.add_many(xs)
+
+  @property
+  def mean(self):
+    return self.moments.mean
+
+  def summary(self):
+    out = {"n": self.moments.n, "mean": self.moments.mean, "std": self.moments.std,
+           "min": self.moments.min, "max": self.moments.max}
+    for p, q in self.quantiles.items():
+      if q.n or self.histogram is None:
+        out["p{:g}".format(100 * p)] = q.value()
+      else:
+        # Interpolating within a bin can land outside the observed range, e.g. when every
+        # sample is 0
+        value = self.histogram.quantile(p)
+        if self.moments.n:
+          value = min(max(value, self.moments.min), self.moments.max)
+        out["p{:g}".format(100 * p)] = value
+    return out
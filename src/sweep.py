@@ -0,0 +1,159 @@
+import csv
+import glob
+import hashlib
+import inspect
+import itertools
+import json
+import os
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+from tabulate import tabulate
+
+from .replicate import _replicate
+
+# Summary metrics reported per point, as (column, metric, statistic)
+COLUMNS = [("wait", "wait", "mean"), ("wait_p99", "wait", "p99"), ("service", "service", "mean"),
+           ("sojourn", "sojourn", "mean")]
+
+def grid_points(grid):
+  # GRID is either a dict of parameter -> list of values (every combination is a point)
+  # or a list of parameter dicts
+  if isinstance(grid, dict):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+  return [dict(point) for point in grid]
+
+def code_version(model):
+  # Hash of the simulator sources and of the file MODEL is defined in, so editing either
+  # invalidates cached results
+  here = os.path.dirname(os.path.abspath(__file__))
+  files = sorted(glob.glob(os.path.join(here, "*.py")))
+  model_file = inspect.getsourcefile(model)
+  if model_file and os.path.abspath(model_file) not in files:
+    files.append(os.path.abspath(model_file))
+  digest = hashlib.sha1()
+  for path in files:
+    with open(path, "rb") as f:
+      digest.update(f.read())
+  return digest.hexdigest()[:12]
+
+
+class _Point(object):
+  """Picklable factory building MODEL(**PARAMS, env=env)"""
+  def __init__(self, model, params):
+    self.model = model
+    self.params = params
+
+  def __call__(self, env):
+    return self.model(env=env, **self.params)
+
+
+class Sweep(object):
+  """
+  Runs a model over a grid of parameters with results cached on disk
+  Each point is stored as its own JSON file under CACHE_DIR, named by a hash of the model,
+  parameters, packet count, seed, engine and code version. Running the sweep again only
+  simulates the points whose file is missing, so growing or refining a corner of the grid
+  only costs the new points
+  """
+  def __init__(self, model, N, seed = 122, fast = False, cache_dir = ".sweep_cache", version = None):
+    self.model = model
+    self.name = "{}.{}".format(model.__module__, model.__qualname__)
+    self.N = N
+    self.seed = seed
+    self.fast = fast
+    self.cache_dir = cache_dir
+    self.version = version or code_version(model)
+    self.computed = 0
+    self.cached = 0
+
+  def key(self, params):
+    desc = json.dumps({"model": self.name, "params": params, "N": self.N, "seed": self.seed,
+                       "fast": self.fast, "version": self.version}, sort_keys=True)
+    return hashlib.sha1(desc.encode()).hexdigest()
+
+  def _path(self, key):
+    return os.path.join(self.cache_dir, key + ".json")
+
+  def _load(self, key):
+    try:
+      with open(self._path(key)) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return None
+
+  def _store(self, key, params, summary):
+    os.makedirs(self.cache_dir, exist_ok=True)
+    record = {"model": self.name, "params": params, "N": self.N, "seed": self.seed,
+              "fast": self.fast, "version": self.version, "summary": summary}
+    # Written aside and renamed so an interrupted sweep never leaves half a file behind
+    tmp = self._path(key) + ".tmp"
+    with open(tmp, "w") as f:
+      json.dump(record, f, sort_keys=True)
+    os.replace(tmp, self._path(key))
+    return record
+
+  def _job(self, key, params):
+    # Every point has its own stream, derived from the seed and the point itself, so a
+    # point's result doesn't depend on what else is in the grid
+    seq = np.random.SeedSequence(self.seed, spawn_key=(int(key[:8], 16),))
+    return _Point(self.model, params), self.N, seq, self.fast
+
+  def run(self, grid, processes = None):
+    # Returns one row per point, in grid order
+    points = grid_points(grid)
+    keys = [self.key(params) for params in points]
+    records = {key: self._load(key) for key in set(keys)}
+    missing = [key for key in records if records[key] is None]
+    params_of = dict(zip(keys, points))
+    self.cached = len(records) - len(missing)
+    self.computed = len(missing)
+
+    jobs = [self._job(key, params_of[key]) for key in missing]
+    processes = min(processes or cpu_count(), len(jobs))
+    if processes <= 1:
+      self._collect(records, params_of, missing, map(_replicate, jobs))
+    else:
+      with Pool(processes) as pool:
+        self._collect(records, params_of, missing, pool.imap(_replicate, jobs))
+    return [self.row(records[key]) for key in keys]
+
+  def _collect(self, records, params_of, missing, summaries):
+    # Each point is stored as soon as it is done, so an interrupted sweep keeps its progress
+    for key, summary in zip(missing, summaries):
+      records[key] = self._store(key, params_of[key], summary)
+
+  def row(self, record):
+    row = {"model": record["model"].rsplit(".", 1)[-1]}
+    row.update(record["params"])
+    row["N"] = record["N"]
+    row["seed"] = record["seed"]
+    summary = record["summary"]
+    for column, metric, stat in COLUMNS:
+      row[column] = summary[metric][stat]
+    row["avg_in_system"] = summary["avg_in_system"]
+    return row
+
+
+def write_table(rows, path):
+  # Tidy CSV, one line per point with floats in repr form, so reruns diff cleanly
+  columns = list(rows[0]) if rows else []
+  with open(path, "w", newline="") as f:
+    writer = csv.DictWriter(f, columns, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows({k: repr(v) if isinstance(v, float) else v for k, v in row.items()} for row in rows)
+
+def print_table(rows):
+  print(tabulate(rows, headers="keys", tablefmt="fancy_grid", floatfmt=".6f"))
+
+def sweep(model, grid, N, seed = 122, fast = False, processes = None, cache_dir = ".sweep_cache", out = None):
+  """
+  Runs MODEL (a Queue class built as MODEL(env=env, **params)) for every point of GRID
+  and returns the table rows, reusing cached points. With OUT the table is also written
+  there as CSV
+  """
+  rows = Sweep(model, N, seed, fast, cache_dir).run(grid, processes)
+  if out:
+    write_table(rows, out)
+  return rows
@@ -1,5 +1,7 @@
 import unittest
+from ..checkpoint import checkpoint, restore
 from ..components import StreetGraph, EuclideanNode
+from ..discrete import Environment
 
 class TestStringMethods(unittest.TestCase):
 
@@ -88,6 +90,29 @@ class TestStringMethods(unittest.TestCase):
     ferrari.drive()
     self.assert_car_position(ferrari.position(), (3,.5))
 
+  def test_car_checkpoint(self):
+    g = StreetGraph(nodeCls = EuclideanNode)
+    for i, label in enumerate('ABCD'):
+      g.add_node(i, i % 2, label)
+    g.add_edge('A', 'B')
+    g.add_edge('B', 'C')
+    g.add_edge('C', 'D')
+    ferrari = g.add_car('A', 'D', 'One fast car', .5)
+    e = Environment()
+    for t in range(1, 5):
+      e.add_event(ferrari.drive, t)
+    e.run_till_time(3)
+    branch, (restored,) = restore(checkpoint(e, g))
+    car = restored._car_from_label('One fast car')
+    self.assertIsNot(car, ferrari)
+    self.assertEqual(car.getNextNode(), ferrari.getNextNode())
+    self.assert_car_position(car.position(), ferrari.position())
+    self.assertEqual(restored.shortest_path('A', 'D'), g.shortest_path('A', 'D'))
+    branch.run()
+    e.run()
+    self.assert_car_position(car.position(), ferrari.position())
+    self.assertEqual(branch.event_count, 4)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
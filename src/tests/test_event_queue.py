@@ -1,5 +1,10 @@
+import json
+import random
 import unittest
-from ..discrete import Environment
+from functools import partial
+from ..checkpoint import checkpoint, restore
+from ..discrete import CheckpointError, Environment
+from ..schedulers import CalendarQueue, HeapScheduler
 
 class TestDiscreteEventSim(unittest.TestCase):
 
@@ -51,6 +56,149 @@ class TestDiscreteEventSim(unittest.TestCase):
 
     self.assertEqual(x, 122)
 
+  def test_ties_run_in_insertion_order(self):
+    e = Environment()
+    order = []
+    for i in range(5):
+      e.add_event(lambda i=i: order.append(i), 3)
+    e.run()
+    self.assertEqual(order, [0, 1, 2, 3, 4])
+
+  def test_cancel_and_reschedule(self):
+    e = Environment()
+    order = []
+    a = e.add_event(lambda: order.append("a"), 1)
+    b = e.add_event(lambda: order.append("b"), 2)
+    c = e.add_event(lambda: order.append("c"), 3)
+    b.cancel()
+    b.cancel()
+    self.assertFalse(b.pending)
+    self.assertEqual(e.pending_events(), 2)
+    a.reschedule(5)
+    self.assertEqual(a.time, 5)
+    e.run()
+    self.assertEqual(order, ["c", "a"])
+    self.assertEqual(e.event_count, 2)
+
+    b.reschedule(1)
+    e.run()
+    self.assertEqual(order, ["c", "a", "b"])
+    self.assertEqual(e.time_elapsed, 6)
+
+  def test_compaction(self):
+    e = Environment()
+    handles = [e.add_event(lambda: None, t) for t in range(1, 3001)]
+    for h in handles[:2500]:
+      h.cancel()
+    e.do_next_event()
+    self.assertEqual(len(e.event_queue), 499)
+    self.assertEqual(e.time_elapsed, 2501)
+
+  def test_instrumentation(self):
+    e = Environment()
+    self.assertIsNone(e.instrumentation)
+    for i in range(10):
+      e.add_event(lambda: None, i + 1, "tick")
+    e.add_event(lambda: None, 3.5, "tock")
+    profile = e.instrument(sample_every = 2)
+    e.do_next_event()
+    self.assertEqual(profile.queue_size, 10)
+    e.run()
+    report = json.loads(profile.to_json())
+    self.assertEqual(report["events"], 11)
+    self.assertEqual(report["peak_queue_size"], 10)
+    self.assertEqual(report["queue_size"], 0)
+    self.assertEqual(report["handlers"]["tick"]["count"], 10)
+    # Sampling goes per message, so the lone "tock" is timed too
+    self.assertEqual(report["handlers"]["tick"]["timed"], 5)
+    self.assertEqual(report["handlers"]["tock"]["timed"], 1)
+    self.assertGreater(report["events_per_sec"], 0)
+
+    self.assertIs(e.uninstrument(), profile)
+    e.add_event(lambda: None, 1, "tick")
+    e.run()
+    self.assertEqual(profile.events, 11)
+
+    # Alternating messages are both sampled, and cancelled entries aren't queue size
+    e = Environment()
+    for i in range(10):
+      e.add_event(lambda: None, i + 1, "arrival" if i % 2 else "departure")
+    e.add_event(lambda: None, 20, "cancelled").cancel()
+    profile = e.instrument(sample_every = 2)
+    e.do_next_event()
+    self.assertEqual(profile.queue_size, 9)
+    e.run()
+    self.assertEqual([profile.report()["handlers"][m]["timed"] for m in ["arrival", "departure"]], [3, 3])
+
+  def test_checkpoint_events(self):
+    e = Environment()
+    log = Log()
+    e.add_event(partial(log.write, "second"), 2)
+    e.add_event(log.tick, 1)
+    e.add_event(log.tick, 3).cancel()
+    # Callable objects are pickled as they are
+    e.add_event(log, 4)
+    e.do_next_event()
+    branch, (restored,) = restore(checkpoint(e, log))
+    self.assertEqual(branch.time_elapsed, 1)
+    self.assertEqual(branch.pending_events(), 2)
+    branch.run()
+    self.assertEqual(restored.lines, ["tick", "second", "call"])
+    self.assertEqual(log.lines, ["tick"])
+
+    e.add_event(lambda: None, 1)
+    self.assertRaises(CheckpointError, checkpoint, e)
+
+
+class Log(object):
+  def __init__(self):
+    self.lines = []
+
+  def write(self, line):
+    self.lines.append(line)
+
+  def tick(self):
+    self.write("tick")
+
+  def __call__(self):
+    self.write("call")
+
+
+class TestSchedulers(unittest.TestCase):
+
+  def test_calendar_queue_order(self):
+    """ Hold model: pop the next event, push a new one a random time later """
+    rng = random.Random(122)
+    for scale in [.001, 1, 1000]:
+      heap, calendar = HeapScheduler(), CalendarQueue()
+      seq = 0
+      for _ in range(500):
+        entry = [rng.expovariate(1) * scale, seq, seq]
+        heap.push(list(entry))
+        calendar.push(list(entry))
+        seq += 1
+      for _ in range(5000):
+        expected = heap.pop()
+        self.assertEqual(calendar.pop(), expected)
+        for _ in range(rng.choice([0, 1, 1, 2])):
+          entry = [expected[0] + rng.expovariate(1) * scale, seq, seq]
+          heap.push(list(entry))
+          calendar.push(list(entry))
+          seq += 1
+      while len(heap):
+        self.assertEqual(calendar.pop(), heap.pop())
+      self.assertEqual(len(calendar), 0)
+      self.assertRaises(IndexError, calendar.pop)
+
+  def test_environment_with_calendar_queue(self):
+    e = Environment(scheduler = CalendarQueue())
+    order = []
+    handles = [e.add_event(lambda t=t: order.append(t), t) for t in [5, 1, 3, 3, 2000, 4]]
+    handles[2].cancel()
+    e.run_till_time(4)
+    self.assertEqual(order, [1, 3, 4])
+    e.run()
+    self.assertEqual(order, [1, 3, 4, 5, 2000])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,89 @@
+import unittest
+from ..components import StreetGraph, EuclideanNode
+
+def build_city():
+  """
+  B - C   F - G
+  |   |   |   |
+  A   D - E   H
+  """
+  g = StreetGraph(nodeCls = EuclideanNode)
+  for x, y, label in [(0, 0, 'A'), (0, 1, 'B'), (1, 1, 'C'), (1, 0, 'D'),
+                      (2, 0, 'E'), (2, 1, 'F'), (3, 1, 'G'), (3, 0, 'H')]:
+    g.add_node(x, y, label)
+  for a, b in ['AB', 'BC', 'CD', 'DE', 'EF', 'FG', 'GH']:
+    g.add_edge(a, b)
+  return g
+
+class TestFleet(unittest.TestCase):
+
+  def assert_positions(self, expected, actual):
+    self.assertEqual(len(expected), len(actual))
+    for e, a in zip(expected, actual):
+      self.assertAlmostEqual(e[0], a[0])
+      self.assertAlmostEqual(e[1], a[1])
+
+  def test_matches_car_drive(self):
+    specs = [('A', 'H', 'a', .5), ('H', 'A', 'b', .7), ('C', 'F', 'c', 2.5), ('E', 'E', 'd', 1)]
+    reference = build_city()
+    ref_cars = [reference.add_car(*spec) for spec in specs]
+    g = build_city()
+    for spec in specs:
+      g.add_car(*spec)
+
+    for tick in range(12):
+      if tick == 3:
+        ref_cars[0].set_speed(2)
+        g._car_from_label('a').set_speed(2)
+      for car in ref_cars:
+        if car.getNextNode():
+          car.drive()
+      positions = g.drive_all()
+      self.assert_positions([car.position() for car in ref_cars], positions)
+
+  def test_stop_fleet_syncs_cars(self):
+    g = build_city()
+    ferrari = g.add_car('A', 'H', 'One fast car', .5)
+    g.drive_all()
+    g.stop_fleet()
+    self.assert_positions([(0, .5)], [ferrari.position()])
+    ferrari.set_speed(6)
+    ferrari.drive()
+    self.assert_positions([(3, .5)], [ferrari.position()])
+    self.assertEqual(ferrari.getNextNode(), 'H')
+
+    # Adding a car hands state back to the cars before the next fleet is built
+    g.drive_all()
+    g.add_car('B', 'C', 'slowpoke', .25)
+    self.assertIsNone(ferrari.getNextNode())
+    self.assert_positions([(3, 0), (.25, 1)], g.drive_all())
+
+  def test_cars_read_through_fleet(self):
+    g = build_city()
+    a = g.add_car('A', 'H', 'a', 1)
+    b = g.add_car('H', 'A', 'b', .7)
+    g.drive_all()
+    positions = g.drive_all()
+    # The cars see the fleet's state without stopping it
+    self.assert_positions(positions, [a.position(), b.position()])
+    self.assertEqual(a.getNextNode(), 'D')
+
+    # Driving one car on its own carries on from the fleet, and the fleet from it
+    a.drive()
+    self.assert_positions([(1, 0)], [a.position()])
+    positions = g.drive_all()
+    reference = build_city()
+    ref_a = reference.add_car('A', 'H', 'a', 1)
+    ref_b = reference.add_car('H', 'A', 'b', .7)
+    for _ in range(3):
+      ref_a.drive()
+      ref_b.drive()
+    ref_a.drive()
+    self.assert_positions([ref_a.position(), ref_b.position()], positions)
+    self.assert_positions(positions, [a.position(), b.position()])
+    self.assertEqual(a.getNextNode(), 'F')
+    self.assertIsNotNone(g._fleet)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from ..components import StreetGraph, EuclideanNode, ManhattanNode
+
+def build_grid(nodeCls, n = 5):
+  sg = StreetGraph(nodeCls = nodeCls)
+  for x in range(n):
+    for y in range(n):
+      sg.add_node(x, y, (x, y))
+  for x in range(n):
+    for y in range(n):
+      if x < n - 1 and y % 2 == 0:
+        sg.add_edge((x, y), (x + 1, y))
+      if y < n - 1:
+        sg.add_edge((x, y), (x, y + 1))
+  return sg
+
+class TestFrozenStreetGraph(unittest.TestCase):
+
+  def test_csr_layout(self):
+    sg = StreetGraph()
+    sg.add_node(0, 0, "A")
+    sg.add_node(0, 1, "B")
+    sg.add_node(1, 1, "C")
+    sg.add_edge("A", "B", 24)
+    sg.add_edge("A", "C", 3)
+    frozen = sg.freeze()
+    self.assertEqual(list(frozen.offsets), [0, 2, 3, 4])
+    self.assertEqual(list(frozen.targets), [1, 2, 0, 0])
+    self.assertEqual(frozen.get_edge("A", "C"), 3)
+    self.assertEqual(frozen.get_xy_coords("C"), (1, 1))
+    self.assertRaises(KeyError, frozen.get_edge, "B", "C")
+    self.assertRaises(ValueError, frozen.weights.__setitem__, 0, 1)
+
+  def test_routes_match(self):
+    for nodeCls in [EuclideanNode, ManhattanNode]:
+      sg = build_grid(nodeCls)
+      frozen = sg.freeze()
+      dist, pred = frozen.shortest_path_tree((0, 0))
+      for target in [(4, 4), (3, 1), (0, 4)]:
+        path, d = sg.shortest_path((0, 0), target)
+        fpath, fd = frozen.shortest_path((0, 0), target, astar = True)
+        self.assertAlmostEqual(d, fd)
+        self.assertAlmostEqual(d, dist[frozen._index[target]])
+        self.assertEqual(fpath[-1], target)
+        self.assertEqual(frozen.path_from_tree(pred, target)[0], (0, 0))
+
+  def test_car_on_frozen_graph(self):
+    frozen = build_grid(EuclideanNode).freeze()
+    car = frozen.add_car((0, 0), (2, 0), "herbie", .5)
+    car.drive()
+    car.drive()
+    car.drive()
+    x, y = car.position()
+    self.assertAlmostEqual(x, 1.5)
+    self.assertAlmostEqual(y, 0)
+
+  def test_pickle_round_trip(self):
+    import pickle
+    frozen = build_grid(ManhattanNode).freeze()
+    copy = pickle.loads(pickle.dumps(frozen))
+    self.assertEqual(copy.shortest_path((0, 0), (4, 4)), frozen.shortest_path((0, 0), (4, 4)))
+
+
+class TestBatchRouting(unittest.TestCase):
+
+  def test_add_cars(self):
+    for processes in [1, 2]:
+      sg = build_grid(EuclideanNode)
+      specs = [((0, 0), (4, 4), "a", 1), ((0, 0), (2, 3), "b", 2),
+               ((4, 0), (0, 4), "c", 1), ((4, 0), (4, 0), "d", 1)]
+      cars = sg.add_cars(specs, processes = processes)
+      self.assertEqual(len(cars), 4)
+      self.assertIs(sg._car_from_label("c"), cars[2])
+      for car, (origin, dest, label, speed) in zip(cars, specs):
+        # A plain cold add_car, ties on the grid break the same way as in the batch trees
+        single = build_grid(EuclideanNode).add_car(origin, dest, label, speed)
+        self.assertEqual(car._route, single._route)
+        self.assertEqual(car.position(), single.position())
+        if car.getNextNode():
+          car.drive()
+          single.drive()
+          self.assertEqual(car.position(), single.position())
+
+
+if __name__ == '__main__':
+    unittest.main()
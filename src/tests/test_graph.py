@@ -19,6 +19,113 @@ class TestGraph(unittest.TestCase):
     self.assertEqual(dist, 15)
     self.assertEqual(path, ["A", "C", "D"])
 
+  def test_dijkstra_unreachable(self):
+    sg = StreetGraph()
+    sg.add_node(0, 0, "A")
+    sg.add_node(0, 1, "B")
+    path, dist = sg.shortest_path("A", "B")
+    self.assertEqual(dist, float("inf"))
+    self.assertEqual(path, ["B"])
+
+  def test_astar_matches_dijkstra(self):
+    for nodeCls in [EuclideanNode, ManhattanNode]:
+      sg = StreetGraph(nodeCls = nodeCls, route_cache_size = 0)
+      for x in range(6):
+        for y in range(6):
+          sg.add_node(x, y + (x % 2) * .3, (x, y))
+      for x in range(6):
+        for y in range(6):
+          if x < 5 and (x + y) % 3:
+            sg.add_edge((x, y), (x + 1, y))
+          if y < 5:
+            sg.add_edge((x, y), (x, y + 1))
+      tree_dist, _ = sg.shortest_path_tree((0, 0))
+      for target in [(5, 5), (4, 0), (0, 3)]:
+        path, dist = sg.shortest_path((0, 0), target)
+        apath, adist = sg.shortest_path((0, 0), target, astar = True)
+        self.assertAlmostEqual(dist, tree_dist[target])
+        self.assertAlmostEqual(dist, adist)
+        self.assertEqual(apath[0], (0, 0))
+        self.assertEqual(apath[-1], target)
+
+  def test_ties_break_the_same_way(self):
+    # A plain grid is full of equally short routes; whichever search answers, and whatever
+    # was asked before, the route must be the same
+    for nodeCls in [EuclideanNode, ManhattanNode]:
+      def grid(cache):
+        sg = StreetGraph(nodeCls = nodeCls, route_cache_size = cache)
+        for x in range(7):
+          for y in range(7):
+            sg.add_node(x, y, (x, y))
+        for x in range(7):
+          for y in range(7):
+            if x < 6:
+              sg.add_edge((x, y), (x + 1, y))
+            if y < 6:
+              sg.add_edge((x, y), (x, y + 1))
+        return sg
+      cold, cached = grid(0), grid(8)
+      frozen = cold.freeze()
+      for source in [(0, 0), (3, 2), (6, 6)]:
+        _, pred = frozen.shortest_path_tree(source)
+        for target in [(6, 6), (0, 5), (4, 4), (6, 0)]:
+          expected = cold.shortest_path(source, target)
+          self.assertEqual(cold.shortest_path(source, target, astar = True), expected)
+          # Cold miss, repeated miss building the tree, then a hit from the tree
+          for _ in range(3):
+            self.assertEqual(cached.shortest_path(source, target, astar = True), expected)
+          self.assertEqual(frozen.shortest_path(source, target, astar = True), expected)
+          self.assertEqual(frozen.path_from_tree(pred, target), expected[0])
+
+  def test_route_cache(self):
+    sg = StreetGraph(route_cache_size = 2)
+    for i, label in enumerate("ABCD"):
+      sg.add_node(i, 0, label)
+    sg.add_edge("A", "B", 1)
+    sg.add_edge("B", "C", 1)
+    sg.add_edge("C", "D", 1)
+
+    # A source's first miss is a point to point search, its second one builds the tree
+    self.assertEqual(sg.shortest_path("A", "D", astar = True), (["A", "B", "C", "D"], 3))
+    self.assertEqual(sg.route_cache_info().currsize, 0)
+    self.assertEqual(sg.shortest_path("A", "C"), (["A", "B", "C"], 2))
+    self.assertEqual(sg.shortest_path("A", "B"), (["A", "B"], 1))
+    info = sg.route_cache_info()
+    self.assertEqual((info.hits, info.misses, info.currsize), (1, 2, 1))
+
+    for source in "BBCC":
+      sg.shortest_path(source, "D")
+    self.assertEqual(sg.route_cache_info().currsize, 2)
+    sg.shortest_path("A", "D")
+    self.assertEqual(sg.route_cache_info().misses, 7)
+
+    # New topology drops every cached tree
+    sg.add_edge("A", "D", 1)
+    self.assertEqual(sg.route_cache_info().currsize, 0)
+    self.assertEqual(sg.shortest_path("A", "D"), (["A", "D"], 1))
+
+    dist, prev = sg.shortest_path_tree("A")
+    self.assertEqual(dist["C"], 2)
+    self.assertEqual(prev["A"], None)
+
+  def test_label_index(self):
+    sg = StreetGraph()
+    sg.add_node(0, 0, "A")
+    sg.add_node(3, 4, "B")
+    sg.add_edge("A", "B", 5)
+    self.assertEqual(sg.get_xy_coords("B"), (3, 4))
+    self.assertEqual(sg._node_from_label("A")._id, 0)
+    self.assertEqual(sg._node_from_label("B")._id, 1)
+    self.assertIs(sg._node_from_id(1), sg._node_from_label("B"))
+    self.assertRaises(Exception, sg._node_from_label, "C")
+    self.assertRaises(Exception, sg.add_node, 1, 1, "A")
+
+    car = sg.add_car("A", "B", "herbie")
+    self.assertIs(sg._car_from_label("herbie"), car)
+    self.assertRaises(Exception, sg.add_car, "B", "A", "herbie")
+    self.assertEqual(len(sg._cars), len(sg._car_index))
+    self.assertRaises(Exception, sg._car_from_label, "kitt")
+
 
 class TestEuclideanNode(unittest.TestCase):
 
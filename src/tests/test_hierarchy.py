@@ -0,0 +1,99 @@
+import os
+import random
+import tempfile
+import unittest
+from ..checkpoint import checkpoint, restore
+from ..components import StreetGraph, EuclideanNode
+from ..discrete import Environment
+from ..hierarchy import ContractionHierarchy
+
+def build_random_city(n = 120, seed = 7):
+  rng = random.Random(seed)
+  sg = StreetGraph(nodeCls = EuclideanNode, route_cache_size = 0)
+  for i in range(n):
+    sg.add_node(rng.uniform(0, 100), rng.uniform(0, 100), "N{}".format(i))
+  for i in range(1, n):
+    # Spanning tree keeps it connected, plus a few extra roads
+    sg.add_edge("N{}".format(i), "N{}".format(rng.randrange(i)))
+  for _ in range(n):
+    a, b = rng.sample(range(n), 2)
+    if sg._node_from_label("N{}".format(b)) not in sg._node_from_label("N{}".format(a))._neighbors:
+      sg.add_edge("N{}".format(a), "N{}".format(b))
+  return sg
+
+class TestContractionHierarchy(unittest.TestCase):
+
+  def assert_valid_path(self, sg, path, dist):
+    total = sum(sg.get_edge(a, b) for a, b in zip(path, path[1:]))
+    self.assertAlmostEqual(total, dist)
+
+  def test_matches_dijkstra(self):
+    sg = build_random_city()
+    ch = ContractionHierarchy.build(sg.freeze())
+    rng = random.Random(1)
+    for _ in range(40):
+      a, b = ("N{}".format(i) for i in rng.sample(range(120), 2))
+      path, dist = sg.shortest_path(a, b)
+      chpath, chdist = ch.shortest_path(a, b)
+      self.assertAlmostEqual(dist, chdist)
+      self.assertEqual((chpath[0], chpath[-1]), (a, b))
+      self.assert_valid_path(sg, chpath, chdist)
+
+  def test_street_graph_uses_hierarchy(self):
+    sg = build_random_city(40)
+    expected = sg.shortest_path("N3", "N17")
+    sg.build_hierarchy()
+    path, dist = sg.shortest_path("N3", "N17")
+    self.assertAlmostEqual(dist, expected[1])
+    self.assertEqual(path[0], "N3")
+
+    with tempfile.TemporaryDirectory() as tmp:
+      filename = os.path.join(tmp, "city.npz")
+      sg._hierarchy.save(filename)
+      sg.add_node(500, 500, "far away")
+      self.assertIsNone(sg._hierarchy)
+      self.assertRaises(Exception, sg.load_hierarchy, filename)
+
+      other = build_random_city(40)
+      other.load_hierarchy(filename)
+      self.assertAlmostEqual(other.shortest_path("N3", "N17")[1], expected[1])
+
+  def test_save_load_round_trip(self):
+    sg = build_random_city(40)
+    expected = sg.shortest_path("N3", "N17")
+    sg.build_hierarchy()
+    with tempfile.TemporaryDirectory() as tmp:
+      # No ".npz" suffix, the file has to be found under the same name
+      filename = os.path.join(tmp, "city")
+      sg._hierarchy.save(filename)
+      other = build_random_city(40)
+      other.load_hierarchy(filename)
+      self.assertEqual(other.shortest_path("N3", "N17")[1], expected[1])
+
+      # Same labels, one road a bit longer: the hierarchy no longer fits
+      changed = build_random_city(40)
+      a = changed._node_from_label("N3")
+      b, d = next(iter(a._neighbors.items()))
+      a._neighbors[b] = b._neighbors[a] = d + 1
+      self.assertRaises(Exception, changed.load_hierarchy, filename)
+      self.assertIsNone(changed._hierarchy)
+
+  def test_checkpoint_keeps_hierarchy(self):
+    sg = build_random_city(40)
+    sg.build_hierarchy()
+    expected = sg.shortest_path("N3", "N17")
+    env, (restored,) = restore(checkpoint(Environment(), sg))
+    self.assertIsNotNone(restored._hierarchy)
+    self.assertEqual(restored.shortest_path("N3", "N17"), expected)
+
+  def test_unreachable(self):
+    sg = StreetGraph()
+    sg.add_node(0, 0, "A")
+    sg.add_node(0, 1, "B")
+    sg.build_hierarchy()
+    self.assertEqual(sg.shortest_path("A", "B"), (["B"], float("inf")))
+    self.assertEqual(sg.shortest_path("A", "A"), (["A"], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from ..components import StreetGraph, EuclideanNode
+from ..discrete import Environment
+from ..kinetic import KineticRoutingGraph
+
+def build_road():
+  g = StreetGraph(nodeCls = EuclideanNode)
+  g.add_node(0, 0, 'A')
+  g.add_node(100, 0, 'B')
+  g.add_edge('A', 'B')
+  return g
+
+class TestKineticRoutingGraph(unittest.TestCase):
+
+  def drive_every_tick(self, env, g, ticks):
+    def tick():
+      for c in g._cars:
+        if c.getNextNode():
+          c.drive()
+    for t in range(1, ticks + 1):
+      env.add_event(tick, t, "Driving")
+
+  def test_link_breaks_on_schedule(self):
+    g = build_road()
+    env = Environment()
+    fast = g.add_car('A', 'B', 'fast', 1)
+    slow = g.add_car('A', 'B', 'slow', .5)
+    fast._rad = slow._rad = 2.9
+    rg = KineticRoutingGraph(g, env)
+    self.drive_every_tick(env, g, 20)
+    rg.start()
+    self.assertAlmostEqual(fast.getLinkLife('slow'), 5.8)
+
+    env.run_till_time(5)
+    self.assertEqual(len(rg.links()), 1)
+    env.run_till_time(6)
+    self.assertEqual(rg.links(), {})
+    self.assertIsNone(fast.getLinkLife('slow'))
+    self.assertEqual(rg.link_events, 1)
+
+  def test_speed_change_reschedules(self):
+    g = build_road()
+    env = Environment()
+    fast = g.add_car('A', 'B', 'fast', 1)
+    slow = g.add_car('A', 'B', 'slow', .5)
+    fast._rad = slow._rad = 2.9
+    rg = KineticRoutingGraph(g, env)
+    self.drive_every_tick(env, g, 20)
+    env.add_event(lambda: slow.set_speed(1), 3.5, "Speed up")
+    rg.start()
+
+    env.run_till_time(15)
+    # Same speed from t=3.5 on, so the link never breaks and the stale break is ignored
+    self.assertEqual(list(rg.links().values()), [float('inf')])
+    self.assertEqual(rg.link_events, 0)
+
+  def test_link_forms_for_approaching_cars(self):
+    g = build_road()
+    env = Environment()
+    east = g.add_car('A', 'B', 'east', 1)
+    west = g.add_car('B', 'A', 'west', 1)
+    east._rad = west._rad = 2.9
+    rg = KineticRoutingGraph(g, env)
+    self.drive_every_tick(env, g, 60)
+    rg.start()
+    self.assertEqual(rg.links(), {})
+
+    env.run_till_time(49)
+    self.assertEqual(len(rg.links()), 1)
+    self.assertAlmostEqual(east.getLinkLife('west'), 2.9)
+    env.run_till_time(52)
+    self.assertEqual(rg.links(), {})
+    self.assertEqual(rg.link_events, 2)
+
+  def test_horizon_rescan_ends(self):
+    g = build_road()
+    env = Environment()
+    fast = g.add_car('A', 'B', 'fast', 1)
+    slow = g.add_car('A', 'B', 'slow', .5)
+    fast._rad = slow._rad = 2.9
+    rg = KineticRoutingGraph(g, env, horizon = 5)
+    self.drive_every_tick(env, g, 20)
+    rg.start()
+    # Once nothing drives the cars any more, rescans stop and run() returns
+    env.run()
+    self.assertEqual(env.pending_events(), 0)
+    self.assertLess(env.time_elapsed, 30)
+
+  def test_fleet_turns_reschedule(self):
+    g = StreetGraph(nodeCls = EuclideanNode)
+    g.add_node(0, 0, 'A')
+    g.add_node(10, 0, 'B')
+    g.add_node(10, 10, 'C')
+    g.add_node(12, 5, 'D')
+    g.add_edge('A', 'B')
+    g.add_edge('B', 'C')
+    env = Environment()
+    car = g.add_car('A', 'C', 'car', 1)
+    parked = g.add_car('D', 'D', 'parked', 1)
+    car._rad = parked._rad = 2.9
+    rg = KineticRoutingGraph(g, env)
+    for t in range(1, 21):
+      env.add_event(g.drive_all, t, "Driving")
+    rg.start()
+
+    # Going straight on the car would never get in range, after turning at B it does
+    env.run_till_time(15)
+    self.assertEqual(len(rg.links()), 1)
+    self.assertAlmostEqual(list(rg.links().values())[0], 2.1)
+    self.assertAlmostEqual(car.getLinkLife('parked'), 4.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
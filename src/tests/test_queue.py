@@ -0,0 +1,354 @@
+import os
+import random
+import tempfile
+from functools import partial
+import unittest
+import numpy as np
+from ..buffer import PacketBuffer
+from ..checkpoint import checkpoint, restore
+from ..discrete import Environment, NoEventError, Source
+from ..lindley import LindleyEngine, ReplayQueue, lindley_waits
+from ..queue import Queue
+from ..replicate import replicate
+from ..sweep import Sweep, write_table
+from ..stats import BatchMeans, DelayStats, Histogram, P2Quantile, RunningStats, mser, t_quantile
+
+class FixedQueue(Queue):
+  """Deterministic queue: a packet every ARRIVAL time units, each taking SERVICE to serve"""
+  def __init__(self, arrival, service, env):
+    super().__init__(env)
+    self.arrival = arrival
+    self.service = service
+
+  @property
+  def arrival_rate(self):
+    return self.arrival
+
+  @property
+  def service_rate(self):
+    return self.service
+
+  def expected_values(self):
+    return {"service": self.service}
+
+
+class ExpQueue(Queue):
+  """M/M/1 queue that can also draw its times in blocks"""
+  def __init__(self, lamb, mu, env):
+    super().__init__(env)
+    self.lamb = lamb
+    self.mu = mu
+
+  @property
+  def arrival_rate(self):
+    return random.expovariate(self.lamb)
+
+  @property
+  def service_rate(self):
+    return random.expovariate(self.mu)
+
+  def sample_interarrivals(self, n, rng):
+    return rng.exponential(1/self.lamb, n)
+
+  def sample_services(self, n, rng):
+    return rng.exponential(1/self.mu, n)
+
+  def expected_values(self):
+    return {"service": 1/self.mu}
+
+
+class TestSource(unittest.TestCase):
+
+  def test_only_next_event_pending(self):
+    e = Environment()
+    fired = []
+    source = Source(e, iter([1, 2.5, 4]), lambda: fired.append(e.time_elapsed)).start()
+    self.assertEqual(e.pending_events(), 1)
+    e.do_next_event()
+    self.assertEqual(e.pending_events(), 1)
+    e.run()
+    self.assertEqual(fired, [1, 2.5, 4])
+    self.assertTrue(source.done)
+    self.assertEqual(source.count, 3)
+
+
+class TestQueue(unittest.TestCase):
+
+  def test_lazy_arrivals(self):
+    e = Environment()
+    q = FixedQueue(.01, .006, e)
+    q.keep_trace = True
+    q.generate_arrival_events(1000)
+    peak = 0
+    while True:
+      peak = max(peak, e.pending_events())
+      try:
+        e.do_next_event()
+      except NoEventError:
+        break
+    # One arrival and one departure at most
+    self.assertLessEqual(peak, 2)
+    self.assertEqual(len(q.all_pkts), 1000)
+    self.assertAlmostEqual(q.all_pkts[-1][1], 10)
+    self.assertAlmostEqual(q.all_pkts.as_numpy()["service"].sum(), 6)
+
+  def test_exact_occupancy(self):
+    e = Environment()
+    q = FixedQueue(1, .25, e)
+    q.generate_arrival_events(4)
+    e.run()
+    # Busy a quarter of every unit from t=1 to t=4.25
+    dist = q.occupancy_distribution()
+    self.assertEqual(len(dist), 2)
+    self.assertAlmostEqual(dist[1], 1/4.25)
+    self.assertAlmostEqual(q.average_in_system(), 1/4.25)
+
+    e = Environment()
+    q = FixedQueue(1, 2.5, e)
+    q.generate_arrival_events(3)
+    e.run()
+    # Departures at 3.5, 6 and 8.5: 1 packet over [1, 2) + [6, 8.5), 2 over [2, 3) + [3.5, 6)
+    self.assertEqual([round(t, 6) for t in q.occupancy_time], [1, 3.5, 3.5, .5])
+
+  def test_streaming_stats(self):
+    e = Environment()
+    q = FixedQueue(1, 2.5, e)
+    q.generate_arrival_events(3)
+    e.run()
+    self.assertEqual(len(q.all_pkts), 0)
+    summary = q.summary()
+    self.assertEqual(summary["packets"], 3)
+    # Waits of 0, 1.5 and 3
+    self.assertAlmostEqual(summary["wait"]["mean"], 1.5)
+    self.assertAlmostEqual(summary["wait"]["max"], 3)
+    self.assertAlmostEqual(summary["sojourn"]["mean"], 4)
+    self.assertAlmostEqual(summary["service"]["std"], 0)
+    self.assertEqual(q.wait_stats.histogram.width, .25)
+    self.assertEqual(q.wait_stats.histogram.counts[:13], [1] + [0] * 5 + [1] + [0] * 5 + [1])
+
+  def test_histogram_width(self):
+    # Bins follow the model's mean service time, not whatever the first packet drew
+    for seed in [1, 2]:
+      random.seed(seed)
+      e = Environment()
+      q = ExpQueue(.5, 2, e)
+      q.generate_arrival_events(10)
+      e.run()
+      self.assertEqual(q.sojourn_stats.histogram.width, .05)
+    # Without a known mean only an explicit width gives histograms
+    for width, expected in [(None, None), (.1, .1)]:
+      e = Environment()
+      q = ReplayQueue(e, [1, 1], [.5, .5], hist_width = width)
+      q.generate_arrival_events(2)
+      e.run()
+      self.assertEqual(q.wait_stats.histogram and q.wait_stats.histogram.width, expected)
+
+  def test_checkpoint_branches(self):
+    random.seed(122)
+    e = Environment()
+    q = ExpQueue(8, 10, e)
+    q.keep_trace = True
+    q.generate_arrival_events(2000)
+    e.run_till_time(50)
+    data = checkpoint(e, q)
+    e.run()
+    expected = q.summary()
+    for _ in range(2):
+      # Each restore continues exactly like the original run did
+      branch, (restored,) = restore(data)
+      self.assertLess(branch.time_elapsed, 51)
+      branch.run()
+      self.assertEqual(restored.summary(), expected)
+      self.assertEqual(branch.event_count, e.event_count)
+      self.assertEqual(len(restored.all_pkts), 2000)
+
+  def test_run_until_precision(self):
+    random.seed(122)
+    e = Environment()
+    q = ExpQueue(5, 10, e)
+    estimate = q.run_until_precision("sojourn", .05, max_packets = 10**6)
+    self.assertTrue(estimate["converged"])
+    self.assertLessEqual(estimate["halfwidth"], .05 * estimate["mean"])
+    # M/M/1 sojourn time is 1/(mu - lambda)
+    self.assertLess(abs(estimate["mean"] - .2), 3 * estimate["halfwidth"])
+    self.assertLess(q.summary()["packets"], 10**5)
+    self.assertTrue(q.arrivals.done)
+
+
+class TestPacketBuffer(unittest.TestCase):
+
+  def test_packet_buffer(self):
+    buf = PacketBuffer(capacity = 2)
+    expected = []
+    n = 0
+    for step in range(200):
+      # Keep the ring wrapping around while it grows
+      for _ in range(step % 3 + 1):
+        buf.append((n, n + .5, n + .25))
+        expected.append((n, n + .5, n + .25))
+        n += 1
+      self.assertEqual(buf.popleft(), expected.pop(0))
+    self.assertEqual(len(buf), len(expected))
+    self.assertEqual(list(buf), expected)
+    self.assertEqual(buf[-1], expected[-1])
+    while expected:
+      self.assertEqual(buf.popleft(), expected.pop(0))
+    self.assertRaises(IndexError, buf.popleft)
+    self.assertRaises(ValueError, PacketBuffer, 0)
+
+
+class TestLindley(unittest.TestCase):
+
+  def test_waits(self):
+    waits, backlog = lindley_waits([1, 1, 1, 4], [2.5, 2.5, .5, 1])
+    self.assertEqual(list(waits), [0, 1.5, 3, 0])
+    self.assertEqual(backlog, 1)
+
+  def test_fixed_queue(self):
+    # Same run as test_streaming_stats and test_exact_occupancy, in blocks of two packets
+    summary = LindleyEngine(FixedQueue(1, 2.5, Environment()), block=2).run(3)
+    self.assertEqual(summary["packets"], 3)
+    self.assertAlmostEqual(summary["wait"]["mean"], 1.5)
+    self.assertAlmostEqual(summary["sojourn"]["max"], 5.5)
+    self.assertEqual([round(p * 8.5, 6) for p in summary["occupancy"]], [1, 3.5, 3.5, .5])
+
+  def test_blocks_match_single_pass(self):
+    rng = np.random.default_rng(122)
+    a, s = rng.exponential(1/8, 20000), rng.exponential(1/10, 20000)
+    engine = LindleyEngine(ExpQueue(8, 10, Environment()))
+    whole = engine.run_blocks([(a, s)])
+    blocked = engine.run_blocks((a[i:i + 999], s[i:i + 999]) for i in range(0, 20000, 999))
+    self.assertAlmostEqual(whole["wait"]["mean"], blocked["wait"]["mean"])
+    self.assertAlmostEqual(whole["avg_in_system"], blocked["avg_in_system"])
+
+  def test_cross_check(self):
+    check = ExpQueue(8, 10, Environment()).cross_check(5000, seed=122)
+    self.assertTrue(check["ok"], check["worst"])
+    # M/M/1 at rho = .8: 4 in the system on average
+    self.assertLess(abs(check["fast"]["avg_in_system"] - 4) / 4, .5)
+
+
+class TestReplicate(unittest.TestCase):
+
+  def test_independent_streams(self):
+    serial = replicate(partial(ExpQueue, 8, 10), 2000, 4, seed=122, processes=1)
+    parallel = replicate(partial(ExpQueue, 8, 10), 2000, 4, seed=122, processes=2)
+    self.assertEqual(serial.samples, parallel.samples)
+    waits = serial.samples["wait"]
+    self.assertEqual(len(set(waits)), 4)
+    self.assertEqual(serial.pooled["wait"].n, 8000)
+    self.assertAlmostEqual(serial.pooled["wait"].mean, sum(waits) / 4)
+    mean, half = serial.intervals["wait"]
+    self.assertAlmostEqual(mean, sum(waits) / 4)
+    self.assertGreater(half, 0)
+
+  def test_fast_replications(self):
+    reps = replicate(partial(ExpQueue, 8, 10), 20000, 8, seed=122, processes=1, fast=True)
+    mean, half = reps.intervals["avg_in_system"]
+    self.assertLess(abs(mean - 4), 4 * half)
+    # ExpQueue has no analytic distribution, so none is made up
+    self.assertNotIn("P(0 in system)", reps.expected)
+
+  def test_exact_match_covered(self):
+    # Deterministic service: a zero width interval sitting right on the expected value
+    reps = replicate(partial(FixedQueue, 1, .5), 100, 3, seed=122, processes=1, fast=True)
+    rows = {row[0]: row for row in reps.table()}
+    self.assertEqual(rows["service"][2], 0)
+    self.assertEqual(rows["service"][-1], "yes")
+    self.assertEqual(rows["P(0 in system)"][-1], "")
+
+
+class TestSweep(unittest.TestCase):
+
+  def test_cached_points(self):
+    with tempfile.TemporaryDirectory() as cache:
+      first = Sweep(ExpQueue, 1000, cache_dir=cache, fast=True)
+      rows = first.run({"lamb": [4, 8], "mu": [10]}, processes=1)
+      self.assertEqual(first.computed, 2)
+      self.assertEqual([row["lamb"] for row in rows], [4, 8])
+
+      again = Sweep(ExpQueue, 1000, cache_dir=cache, fast=True)
+      self.assertEqual(again.run({"lamb": [4, 6, 8], "mu": [10]}, processes=1)[::2], rows)
+      self.assertEqual((again.computed, again.cached), (1, 2))
+
+      changed = Sweep(ExpQueue, 1000, cache_dir=cache, fast=True, version="edited")
+      changed.run([{"lamb": 4, "mu": 10}], processes=1)
+      self.assertEqual(changed.computed, 1)
+
+      path = os.path.join(cache, "table.csv")
+      write_table(rows, path)
+      with open(path) as f:
+        self.assertEqual(f.readline().strip().split(","), list(rows[0]))
+
+
+class TestStats(unittest.TestCase):
+
+  def test_mser(self):
+    rng = random.Random(122)
+    xs = [10 - i / 20 for i in range(200)] + [rng.gauss(0, 1) for _ in range(2000)]
+    self.assertTrue(150 <= mser(xs) <= 250)
+    self.assertLessEqual(mser([rng.gauss(0, 1) for _ in range(2000)]), 100)
+
+  def test_batch_means(self):
+    batches = BatchMeans(batch_size = 2, max_batches = 4)
+    for x in range(13):
+      batches.add(x)
+    # Batches of 2 merged into batches of 4 once four were complete, 12 still in progress
+    self.assertEqual(batches.batch_size, 4)
+    self.assertEqual(batches.means, [1.5, 5.5, 9.5])
+    # A steady climb, so MSER cuts off the first batch
+    estimate = batches.estimate(batches = 3)
+    self.assertEqual(estimate["warmup"], 4)
+    self.assertEqual(estimate["batches"], 2)
+    self.assertEqual(estimate["mean"], 7.5)
+    self.assertEqual(estimate["n"], 13)
+
+  def test_t_quantile(self):
+    self.assertAlmostEqual(t_quantile(.975, 1), 12.7062, 3)
+    self.assertAlmostEqual(t_quantile(.975, 2), 4.3027, 3)
+    self.assertAlmostEqual(t_quantile(.975, 9), 2.2622, 3)
+    self.assertAlmostEqual(t_quantile(.995, 30), 2.7500, 3)
+
+  def test_running_stats(self):
+    rng = random.Random(122)
+    xs = [rng.gauss(3, 2) for _ in range(1000)]
+    a, b = RunningStats(), RunningStats()
+    for x in xs[:300]:
+      a.add(x)
+    for x in xs[300:]:
+      b.add(x)
+    merged = a.merge(b)
+    mean = sum(xs) / len(xs)
+    self.assertEqual(merged.n, 1000)
+    self.assertAlmostEqual(merged.mean, mean)
+    self.assertAlmostEqual(merged.variance, sum((x - mean)**2 for x in xs) / 999)
+    self.assertEqual(merged.min, min(xs))
+
+  def test_p2_quantile(self):
+    rng = random.Random(122)
+    xs = [rng.expovariate(1) for _ in range(20000)]
+    ordered = sorted(xs)
+    for p in [.5, .9, .99]:
+      q = P2Quantile(p)
+      for x in xs:
+        q.add(x)
+      exact = ordered[int(p * len(xs))]
+      self.assertLess(abs(q.value() - exact) / exact, .03)
+
+  def test_histogram(self):
+    h = Histogram(.5, 4)
+    for x in [0, .1, .6, 1.9, 2, 7]:
+      h.add(x)
+    self.assertEqual(h.counts, [2, 1, 0, 1])
+    self.assertEqual(h.overflow, 2)
+    self.assertEqual(h.quantile(.5), 1)
+    self.assertEqual(h.merge(h).n, 12)
+
+    # Batched quantiles stay within the observed range
+    stats = DelayStats(.1, 10)
+    stats.add_many([0.] * 100)
+    self.assertEqual(stats.summary()["p99"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import numpy as np
+from ..components import StreetGraph, EuclideanNode
+from ..render import Frame, capture, capture_frame
+
+HAS_MATPLOTLIB = importlib.util.find_spec("matplotlib") is not None
+
+class TestRender(unittest.TestCase):
+
+  def make_graph(self):
+    g = StreetGraph(nodeCls = EuclideanNode)
+    g.add_node(1, 1, 'A')
+    g.add_node(11, 1, 'B')
+    g.add_node(11, 11, 'C')
+    g.add_edge('A', 'B')
+    g.add_edge('B', 'C')
+    g.add_car('A', 'C', 'slow', .5)
+    g.add_car('A', 'B', 'fast', 2)
+    return g
+
+  def test_capture_frame(self):
+    g = self.make_graph()
+    cars = list(g._car_index.values())
+    first = capture_frame(cars, 3)
+    self.assertEqual(first.positions.tolist(), [[1, 1], [1, 1]])
+    self.assertEqual(first.links[0].tolist(), [0])
+    self.assertEqual(first.links[1].tolist(), [1])
+    # Both cars moved on after the capture
+    second = capture_frame(cars, 1)
+    self.assertEqual(second.positions.tolist(), [[1.5, 1], [3, 1]])
+    self.assertEqual(len(second.links[0]), 0)
+
+  @unittest.skipUnless(HAS_MATPLOTLIB, "matplotlib is not installed")
+  def test_renderer_reuses_artists(self):
+    from ..render import FrameRenderer
+    renderer = FrameRenderer(size = 15, figsize = (3, 3), dpi = 50)
+    linked = Frame(np.array([[2., 2], [4, 3], [12, 12]]),
+                   (np.array([0]), np.array([1]), np.array([2.24])))
+    alone = Frame(np.array([[7., 7]]), (np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)))
+    a = renderer.render(linked)
+    b = renderer.render(alone)
+    self.assertEqual(a.shape, (150, 150, 3))
+    self.assertEqual(a.dtype, np.uint8)
+    self.assertFalse((a == b).all())
+    # Drawing the same frame again gives the same pixels, nothing is left over from before
+    self.assertTrue((renderer.render(linked) == a).all())
+    self.assertEqual(len(renderer._labels), 1)
+
+  @unittest.skipUnless(HAS_MATPLOTLIB, "matplotlib is not installed")
+  def test_parallel_frames_in_order(self):
+    from ..render import write_frames
+    frames = list(capture(self.make_graph(), 40, 3))
+    args = dict(size = 15, figsize = (2, 2), dpi = 40)
+    with tempfile.TemporaryDirectory() as tmp:
+      serial, parallel = os.path.join(tmp, "serial.gif"), os.path.join(tmp, "parallel.gif")
+      self.assertEqual(write_frames(frames, serial, processes = 1, **args), 40)
+      self.assertEqual(write_frames(iter(frames), parallel, processes = 2, chunk_size = 3, **args), 40)
+      with open(serial, "rb") as a, open(parallel, "rb") as b:
+        self.assertEqual(a.read(), b.read())
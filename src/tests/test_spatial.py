@@ -0,0 +1,70 @@
+import math
+import random
+import unittest
+from ..components import StreetGraph, EuclideanNode, RoutingGraph
+from ..spatial import GridIndex
+
+class TestGridIndex(unittest.TestCase):
+
+  def brute_force_pairs(self, points, r):
+    pairs = set()
+    for i in range(len(points)):
+      for j in range(i + 1, len(points)):
+        if math.hypot(points[i][0] - points[j][0], points[i][1] - points[j][1]) <= r:
+          pairs.add((i, j))
+    return pairs
+
+  def test_pairs_match_brute_force(self):
+    rng = random.Random(122)
+    points = [(rng.uniform(-20, 20), rng.uniform(-20, 20)) for _ in range(300)]
+    for r in [.5, 2, 7]:
+      i, j, d = GridIndex(points, r).pairs_within()
+      self.assertEqual(set(zip(i.tolist(), j.tolist())), self.brute_force_pairs(points, r))
+      self.assertTrue((i < j).all())
+      self.assertTrue((d <= r).all())
+
+  def test_query(self):
+    points = [(0, 0), (1, 0), (0, 2.5), (-3, -3), (10, 10)]
+    index = GridIndex(points, 1)
+    self.assertEqual(index.query(0, 0, 1).tolist(), [0, 1])
+    self.assertEqual(index.query(0, 0, 3).tolist(), [0, 1, 2])
+    self.assertEqual(index.query(-3, -3.5, .5).tolist(), [3])
+    self.assertRaises(ValueError, index.pairs_within, 2)
+
+
+class TestRoutingGraph(unittest.TestCase):
+
+  def test_link_lifetimes(self):
+    g = StreetGraph(nodeCls = EuclideanNode)
+    g.add_node(0, 0, 'A')
+    g.add_node(10, 0, 'B')
+    g.add_node(0, 5, 'C')
+    g.add_edge('A', 'B')
+    g.add_edge('A', 'C')
+    fast = g.add_car('A', 'B', 'fast', 1)
+    slow = g.add_car('A', 'B', 'slow', .5)
+    far = g.add_car('C', 'A', 'far', 1)
+    fast.drive()
+    rg = RoutingGraph(g)
+    rg.set_link_lifetimes()
+
+    # 1 apart and separating at .5 per tick: out of range (r=1) immediately
+    self.assertAlmostEqual(fast.getLinkLife('slow'), 0)
+    self.assertAlmostEqual(slow.getLinkLife('fast'), 0)
+    self.assertIsNone(fast.getLinkLife('far'))
+
+    slow.drive()
+    slow.set_speed(1)
+    rg.set_link_lifetimes()
+    # .5 apart at equal speed: never separates
+    self.assertEqual(fast.getLinkLife('slow'), math.inf)
+
+    # Radios switched off: no links rather than a degenerate grid
+    for car in [fast, slow, far]:
+      car._rad = 0
+    rg.set_link_lifetimes()
+    self.assertIsNone(fast.getLinkLife('slow'))
+
+
+if __name__ == '__main__':
+    unittest.main()
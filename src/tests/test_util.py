@@ -0,0 +1,31 @@
+import math
+import unittest
+from ..util import quadratic, link_intervals, link_lifetimes
+
+class TestLinkLifetimes(unittest.TestCase):
+
+  def test_matches_quadratic(self):
+    pos = [(.5, 0), (0, -1), (.2, .3)]
+    vel = [(1, 0), (.5, .5), (-2, 1)]
+    lives = link_lifetimes(pos, vel, [1, 2, 1.5])
+    for (px, py), (vx, vy), r, life in zip(pos, vel, [1, 2, 1.5], lives):
+      expected = max(quadratic(vx**2 + vy**2, 2*(px*vx + py*vy), px**2 + py**2 - r**2))
+      self.assertAlmostEqual(life, expected)
+
+  def test_degenerate_cases(self):
+    pos = [(.5, 0), (5, 0), (0, 5), (5, 0)]
+    vel = [(0, 0), (0, 0), (1, 0), (-1, 0)]
+    enter, leave = link_intervals(pos, vel, [1, 1, 1, 1])
+    # No relative motion, in range and out of range
+    self.assertEqual((enter[0], leave[0]), (-math.inf, math.inf))
+    self.assertEqual((enter[1], leave[1]), (math.inf, -math.inf))
+    # Passing by without ever coming within range
+    self.assertEqual((enter[2], leave[2]), (math.inf, -math.inf))
+    # Approaching head on: in range from t=4 to t=6
+    self.assertAlmostEqual(enter[3], 4)
+    self.assertAlmostEqual(leave[3], 6)
+    self.assertEqual(link_lifetimes(pos, vel, [1, 1, 1, 1]).tolist(), [math.inf, 0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,41 @@
+from math import sqrt
+
+import numpy as np
+
 def quadratic(a, b, c):
   d = (b**2) - (4*a*c)
   sol1 = (-b-sqrt(d))/(2*a)
   sol2 = (-b+sqrt(d))/(2*a)
-  return sol1, sol2
\ No newline at end of file
+  return sol1, sol2
+
+def link_intervals(rel_pos, rel_vel, radii):
+  """
+  Batched version of the link life quadratic. For pairs with relative position REL_POS
+  and relative velocity REL_VEL ((N, 2) arrays) and radio radius RADII, returns arrays
+  (enter, leave) of the times between which each pair is within range.
+  Pairs that never come within range get enter = inf, leave = -inf, and pairs with no
+  relative motion that are in range now get enter = -inf, leave = inf
+  """
+  rel_pos = np.asarray(rel_pos, dtype=np.float64).reshape(-1, 2)
+  rel_vel = np.asarray(rel_vel, dtype=np.float64).reshape(-1, 2)
+  c_0 = (rel_pos**2).sum(axis=1) - np.asarray(radii, dtype=np.float64)**2
+  c_1 = 2 * (rel_pos * rel_vel).sum(axis=1)
+  c_2 = (rel_vel**2).sum(axis=1)
+  disc = c_1**2 - 4*c_2*c_0
+
+  enter = np.full(len(c_0), np.inf)
+  leave = np.full(len(c_0), -np.inf)
+  moving = (c_2 > 0) & (disc >= 0)
+  root = np.sqrt(disc[moving])
+  enter[moving] = (-c_1[moving] - root) / (2*c_2[moving])
+  leave[moving] = (-c_1[moving] + root) / (2*c_2[moving])
+  # Parallel motion at equal speed: the distance never changes
+  still = (c_2 == 0) & (c_0 <= 0)
+  enter[still] = -np.inf
+  leave[still] = np.inf
+  return enter, leave
+
+def link_lifetimes(rel_pos, rel_vel, radii):
+  # Time until each pair drifts out of range: inf if it never does, 0 if it is out of range now
+  enter, leave = link_intervals(rel_pos, rel_vel, radii)
+  return np.where((enter <= 0) & (leave >= 0), leave, 0.)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+from mm1 import MM1Queue
+from md1 import MD1Queue
+from dd1 import DD1Queue
+from src.sweep import print_table, sweep, write_table
+
+if __name__ == "__main__":
+  # Points already in .sweep_cache/ are reused, only new or changed ones are simulated.
+  # The table is written next to them unless another path is given: python sweep.py [out.csv]
+  out = sys.argv[1] if len(sys.argv) > 1 else os.path.join(".sweep_cache", "sweep.csv")
+  mu = 200
+  grid = {"lamb": [20, 50, 80, 110, 130, 150, 170, 190], "mu": [mu]}
+  N = int(1e5)
+
+  rows = []
+  for model in [MM1Queue, MD1Queue, DD1Queue]:
+    rows += sweep(model, grid, N, fast=True)
+  print_table(rows)
+  os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+  write_table(rows, out)
+  print("Table written to {}".format(out))